@@ -0,0 +1,124 @@
+from collections import OrderedDict
+from copy import copy
+from hashlib import sha256
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import SAFE_METHODS
+
+
+class LRUCache:
+    """Ограниченный по размеру кеш в памяти процесса с временем жизни
+    записей: при переполнении вытесняются давно не читавшиеся записи."""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.lock = Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value, monotonic() + self.timeout
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_tokens = LRUCache(settings.AUTH_TOKEN_CACHE_SIZE,
+                        settings.AUTH_TOKEN_CACHE_TIMEOUT)
+
+
+def get_shared_cache():
+    alias = settings.AUTH_TOKEN_SHARED_CACHE
+    return caches[alias] if alias else None
+
+
+def get_token_cache_key(key):
+    return f'auth:token:{sha256(key.encode()).hexdigest()}'
+
+
+def forget_tokens(keys):
+    """Удаляет токены из кешей после фиксации транзакции.
+
+    Другие процессы без общего кеша узнают об изменении не позже
+    чем через AUTH_TOKEN_CACHE_TIMEOUT секунд."""
+    keys = list(keys)
+
+    def forget():
+        for key in keys:
+            local_tokens.delete(key)
+        shared = get_shared_cache()
+        if shared is not None:
+            shared.delete_many([get_token_cache_key(key) for key in keys])
+
+    if keys:
+        transaction.on_commit(forget)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кешированием пользователя.
+
+    Пара токен — пользователь хранится в LRU-кеше процесса и, если задан
+    AUTH_TOKEN_SHARED_CACHE, в общем кеше, поэтому запрос авторизованного
+    пользователя не обращается к базе. Записи удаляются при выходе,
+    удалении токена и сохранении пользователя (смена пароля,
+    деактивация).
+
+    Изменяющие запросы могут сохранить request.user (djoser users/me,
+    set_password), поэтому для них пользователь читается из базы:
+    в кеше его поля могли устареть."""
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is None or request.method in SAFE_METHODS:
+            return result
+        user, token = result
+        user = type(user)._default_manager.filter(pk=user.pk).first()
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                'Пользователь неактивен или удален.')
+        return user, token
+
+    def authenticate_credentials(self, key):
+        cached = local_tokens.get(key)
+        shared = get_shared_cache()
+        if cached is None and shared is not None:
+            cached = shared.get(get_token_cache_key(key))
+            if cached is not None:
+                local_tokens.set(key, cached)
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            local_tokens.set(key, cached)
+            if shared is not None:
+                shared.set(get_token_cache_key(key), cached,
+                           timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        user, token = cached
+        # Копия, чтобы изменения request.user в представлении не попали
+        # в кеш и в параллельные запросы.
+        return copy(user), token
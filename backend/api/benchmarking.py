@@ -0,0 +1,89 @@
+import json
+
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Count
+
+from recipes.models import Recipe, Tag
+from users.models import CustomUser
+
+DUMMY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+
+def get_user(username=None):
+    """Пользователь для замеров: заданный или с наибольшим числом
+    подписок."""
+    if username:
+        try:
+            return CustomUser.objects.get(username=username)
+        except CustomUser.DoesNotExist:
+            raise CommandError(f'Пользователь {username} не найден.')
+    user = CustomUser.objects.annotate(
+        subscriptions=Count('subscriber')
+    ).order_by('-subscriptions').first()
+    if user is None:
+        raise CommandError('В базе нет пользователей, заполните её '
+                           'командой generate_fake_data.')
+    return user
+
+
+def get_plan_urls(user):
+    """Адреса основных эндпоинтов для проверки планов запросов.
+
+    Списки запрашиваются с курсорной пагинацией: COUNT(*) обычной
+    постраничной пагинации всегда читает таблицу целиком."""
+    urls = [
+        '/api/recipes/?pagination=cursor',
+        '/api/recipes/?pagination=cursor&is_favorited=1',
+        '/api/recipes/?pagination=cursor&is_in_shopping_cart=1',
+        f'/api/recipes/?pagination=cursor&author={user.pk}',
+        '/api/users/subscriptions/?pagination=cursor&recipes_limit=3',
+        '/api/recipes/feed/',
+        '/api/recipes/download_shopping_cart/',
+    ]
+    tag = Tag.objects.first()
+    if tag is not None:
+        urls.append(f'/api/recipes/?pagination=cursor&tags={tag.slug}')
+    recipe = Recipe.objects.order_by('-favorites_count').first()
+    if recipe is not None:
+        urls.append(f'/api/recipes/{recipe.pk}/')
+    return urls
+
+
+def capture_queries(client, url):
+    """Ответ на GET-запрос и выполненные при этом SELECT-запросы."""
+    queries = []
+
+    def collect(execute, sql, params, many, context):
+        if sql.lstrip(' (').upper().startswith('SELECT'):
+            queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(collect):
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+    return response, queries
+
+
+def explain(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+
+def iter_plan_nodes(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from iter_plan_nodes(child)
+
+
+def get_seq_scans(plan):
+    """Таблицы, которые план читает последовательным сканированием."""
+    return [node['Relation Name'] for node in iter_plan_nodes(plan)
+            if node['Node Type'] == 'Seq Scan']
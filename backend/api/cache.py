@@ -0,0 +1,108 @@
+from hashlib import md5
+from time import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+def get_cache_version(name):
+    """Текущая версия данных и время их последнего изменения."""
+    key = f'{name}:version'
+    version = cache.get(key)
+    if version is None:
+        version = (uuid4().hex, int(time()))
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+async def aget_cache_version(name):
+    """Асинхронный вариант get_cache_version."""
+    key = f'{name}:version'
+    version = await cache.aget(key)
+    if version is None:
+        version = (uuid4().hex, int(time()))
+        if not await cache.aadd(key, version, timeout=None):
+            version = await cache.aget(key, version)
+    return version
+
+
+def get_cache_versions(names):
+    """Версии нескольких наборов данных одним обращением к кешу."""
+    keys = {f'{name}:version': name for name in names}
+    versions = {keys[key]: version
+                for key, version in cache.get_many(keys).items()}
+    for name in set(keys.values()) - set(versions):
+        versions[name] = get_cache_version(name)
+    return versions
+
+
+def bump_cache_version(name):
+    """Сбрасывает закешированные ответы, меняя версию данных.
+
+    Внутри транзакции версия меняется после её фиксации, чтобы
+    параллельный запрос не закешировал старые данные под новой версией."""
+    transaction.on_commit(lambda: cache.set(
+        f'{name}:version', (uuid4().hex, int(time())), timeout=None))
+
+
+class VersionedCacheMixin:
+    """Миксин кеширования ответов list и retrieve по версии данных.
+
+    Версия меняется при сохранении и удалении объектов, поэтому
+    закешированный ответ не устаревает. Ответы снабжаются заголовками
+    ETag и Last-Modified для условных запросов."""
+    cache_name = None
+
+    def get_cache_key(self, request, version):
+        path = request.get_full_path()
+        return f'{self.cache_name}:{version}:{md5(path.encode()).hexdigest()}'
+
+    def patch_cached_response(self, response, etag, last_modified):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        version, last_modified = get_cache_version(self.cache_name)
+        key = self.get_cache_key(request, version)
+        etag = quote_etag(md5(key.encode()).hexdigest())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            data = cache.get(key)
+            if data is None:
+                data = handler(request, *args, **kwargs).data
+                cache.set(key, data, settings.API_CACHE_TIMEOUT)
+            response = Response(data)
+        return self.patch_cached_response(response, etag, last_modified)
+
+    async def aget_cached_response(self, handler, request, *args, **kwargs):
+        """Асинхронный вариант get_cached_response с асинхронным
+        обработчиком."""
+        version, last_modified = await aget_cache_version(self.cache_name)
+        key = self.get_cache_key(request, version)
+        etag = quote_etag(md5(key.encode()).hexdigest())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            data = await cache.aget(key)
+            if data is None:
+                data = (await handler(request, *args, **kwargs)).data
+                await cache.aset(key, data, settings.API_CACHE_TIMEOUT)
+            response = Response(data)
+        return self.patch_cached_response(response, etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request,
+                                        *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request,
+                                        *args, **kwargs)
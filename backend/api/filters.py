@@ -1,15 +1,25 @@
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.db.models import F, Q
 from django_filters.rest_framework import filters, FilterSet
+from rest_framework.filters import BaseFilterBackend
 
-from recipes.models import Ingredient, Recipe, Tag
+from api.indexes import ingredient_index
+from recipes.models import Recipe, Tag
 
 
-class IngredientFilter(FilterSet):
-    """Кастомный фильтр для ингредиентов."""
-    name = filters.CharFilter(lookup_expr='istartswith')
+class IngredientSearchFilter(BaseFilterBackend):
+    """Поиск ингредиентов по началу названия.
 
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+    Обслуживается индексом в памяти процесса без запросов к базе."""
+    search_param = 'name'
+
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param)
+        if name is None or view.action != 'list':
+            return queryset
+        return ingredient_index.search(name)
 
 
 class RecipeFilter(FilterSet):
@@ -33,11 +43,32 @@ class RecipeFilter(FilterSet):
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(favouriting__user=user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(shopping_cart__user=user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """Полнотекстовый поиск рецептов с ранжированием.
+
+    Совпадения ищутся по поисковому документу (название, ингредиенты,
+    описание) и по триграммам названия, что допускает опечатки."""
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        search = request.query_params.get(self.search_param, '').strip()
+        if not search:
+            return queryset
+        query = SearchQuery(search, config=settings.SEARCH_CONFIG,
+                            search_type='websearch')
+        return queryset.annotate(
+            rank=(SearchRank(F('search_vector'), query)
+                  + TrigramSimilarity('name', search))
+        ).filter(
+            Q(search_vector=query) | Q(name__trigram_similar=search)
+        ).order_by('-rank', '-pub_date', '-id')
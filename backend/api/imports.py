@@ -0,0 +1,136 @@
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from api.serializers import RecipeImportSerializer
+from api.utils import (fan_out_recipes, update_counter,
+                       update_search_vectors)
+from recipes.images import schedule_image_processing
+from recipes.models import (Ingredient, IngredientRecipes, Recipe, Tag,
+                            TagRecipes)
+from users.models import CustomUser
+
+
+class RecipeImporter:
+    """Потоковый импорт рецептов из NDJSON: один рецепт на строку.
+
+    Строки проверяются правилами RecipeCreateUpdateSerializer.
+    Ошибочные строки передаются в on_reject, остальные записываются
+    пачками, каждая в своей транзакции. Пачка ограничена и числом
+    строк, и их суммарным размером, поэтому строки с картинками
+    в base64 записываются небольшими пачками. После фиксации пачки номер
+    её последней строки передаётся в on_checkpoint, чтобы прерванный
+    импорт можно было продолжить с этого места."""
+
+    def __init__(self, author, batch_size=None, on_reject=None,
+                 on_checkpoint=None):
+        self.author = author
+        self.batch_size = batch_size or settings.RECIPE_IMPORT_BATCH_SIZE
+        self.on_reject = on_reject
+        self.on_checkpoint = on_checkpoint
+        self.context = {'tags': Tag.objects.in_bulk(),
+                        'ingredients': Ingredient.objects.in_bulk()}
+        self.created = self.rejected = 0
+
+    def reject(self, line_number, line, errors):
+        self.rejected += 1
+        if self.on_reject is not None:
+            self.on_reject(line_number, line, errors)
+
+    def validate_line(self, line_number, line):
+        try:
+            data = json.loads(line)
+        except ValueError as error:
+            self.reject(line_number, line, {'detail': [str(error)]})
+            return None
+        if not isinstance(data, dict):
+            self.reject(line_number, line,
+                        {'detail': ['Ожидается JSON-объект.']})
+            return None
+        serializer = RecipeImportSerializer(data=data, context=self.context)
+        if not serializer.is_valid():
+            self.reject(line_number, line, serializer.errors)
+            return None
+        return serializer.validated_data
+
+    @transaction.atomic
+    def write_batch(self, batch):
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=self.author, name=data['name'], text=data['text'],
+                   image=data['image'], cooking_time=data['cooking_time'])
+            for data in batch
+        )
+        TagRecipes.objects.bulk_create(
+            TagRecipes(recipe=recipe, tag=tag)
+            for recipe, data in zip(recipes, batch)
+            for tag in data['tags']
+        )
+        IngredientRecipes.objects.bulk_create(
+            IngredientRecipes(recipe=recipe, ingredient=ingredient['id'],
+                              amount=ingredient['amount'])
+            for recipe, data in zip(recipes, batch)
+            for ingredient in data['ingredient_used']
+        )
+        update_search_vectors([recipe.pk for recipe in recipes])
+        update_counter(CustomUser, [self.author.pk], 'recipes_count',
+                       len(recipes))
+        fan_out_recipes(recipes)
+        for recipe in recipes:
+            schedule_image_processing(recipe)
+        self.created += len(recipes)
+
+    def exclude_duplicates(self, validated):
+        """Отклоняет рецепты, название которых у автора уже занято,
+        одним запросом на пачку."""
+        names = set(Recipe.objects.filter(
+            author=self.author,
+            name__in=[data['name'] for _, _, data in validated]
+        ).values_list('name', flat=True))
+        batch = []
+        for line_number, line, data in validated:
+            if data['name'] in names:
+                self.reject(line_number, line, {
+                    'name': ['У автора уже есть рецепт с таким названием.']
+                })
+                continue
+            names.add(data['name'])
+            batch.append(data)
+        return batch
+
+    def read_chunk(self, lines):
+        """Следующие строки: не больше batch_size строк и не больше
+        RECIPE_IMPORT_BATCH_BYTES символов в сумме."""
+        chunk, size = [], 0
+        for line_number, line in lines:
+            chunk.append((line_number, line))
+            size += len(line)
+            if (len(chunk) == self.batch_size
+                    or size >= settings.RECIPE_IMPORT_BATCH_BYTES):
+                break
+        return chunk
+
+    def run(self, lines, start=0):
+        """Импортирует строки, пропуская первые start уже
+        обработанных. Возвращает номер последней обработанной строки."""
+        lines = enumerate(lines, 1)
+        last_line = start
+        for _ in islice(lines, start):
+            pass
+        while True:
+            chunk = self.read_chunk(lines)
+            if not chunk:
+                return last_line
+            validated = [
+                (line_number, line, data)
+                for line_number, line in chunk if line.strip()
+                for data in [self.validate_line(line_number, line)]
+                if data is not None
+            ]
+            batch = self.exclude_duplicates(validated) if validated else []
+            if batch:
+                self.write_batch(batch)
+            last_line = chunk[-1][0]
+            if self.on_checkpoint is not None:
+                self.on_checkpoint(last_line)
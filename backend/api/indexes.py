@@ -0,0 +1,56 @@
+from bisect import bisect_left
+from threading import Lock
+
+from api.cache import get_cache_version
+from recipes.models import Ingredient
+
+
+def normalize(value):
+    """Приводит строку к виду для поиска без учёта регистра и ё/е."""
+    return value.casefold().replace('ё', 'е')
+
+
+class IngredientPrefixIndex:
+    """Отсортированный индекс ингредиентов в памяти процесса
+    для поиска по началу названия.
+
+    Строится при первом обращении и перестраивается, когда меняется
+    версия ингредиентов в общем кеше, поэтому изменения видны
+    всем процессам. Найденные ингредиенты отдаются в порядке,
+    в котором их вернула база по ordering модели."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._data = None
+
+    def build(self, version):
+        ingredients = sorted(
+            enumerate(Ingredient.objects.all()),
+            key=lambda item: (normalize(item[1].name), item[0])
+        )
+        keys = [normalize(ingredient.name) for _, ingredient in ingredients]
+        return version, keys, ingredients
+
+    def get_data(self):
+        version = get_cache_version('ingredient')
+        data = self._data
+        if data is None or data[0] != version:
+            with self._lock:
+                data = self._data
+                if data is None or data[0] != version:
+                    data = self._data = self.build(version)
+        return data
+
+    def search(self, prefix):
+        _, keys, ingredients = self.get_data()
+        prefix = normalize(prefix)
+        start = bisect_left(keys, prefix)
+        end = start
+        while end < len(keys) and keys[end].startswith(prefix):
+            end += 1
+        return [ingredient for _, ingredient in sorted(
+            ingredients[start:end], key=lambda item: item[0]
+        )]
+
+
+ingredient_index = IngredientPrefixIndex()
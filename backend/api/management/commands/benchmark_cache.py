@@ -0,0 +1,54 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from api.benchmarking import DUMMY_CACHES
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность эндпоинтов тегов '
+            'и ингредиентов с кешем и без него.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='Количество запросов к каждому адресу.'
+        )
+        parser.add_argument(
+            'urls',
+            nargs='*',
+            default=['/api/tags/', '/api/ingredients/',
+                     '/api/ingredients/?name=мо'],
+        )
+
+    def measure(self, url, count, **headers):
+        client = Client()
+        client.get(url)
+        start = perf_counter()
+        for _ in range(count):
+            response = client.get(url, **headers)
+        return count / (perf_counter() - start), response.status_code
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        self.stdout.write(f'{"URL":<40}{"без кеша":>12}{"с кешем":>12}'
+                          f'{"304":>12}')
+        with override_settings(ALLOWED_HOSTS=['*']):
+            for url in options['urls']:
+                with override_settings(CACHES=DUMMY_CACHES):
+                    uncached, _ = self.measure(url, count)
+                cached, _ = self.measure(url, count)
+                etag = Client().get(url)['ETag']
+                not_modified, status = self.measure(
+                    url, count, HTTP_IF_NONE_MATCH=etag)
+                self.stdout.write(
+                    f'{url:<40}{uncached:>10.0f}/с{cached:>10.0f}/с'
+                    f'{not_modified:>10.0f}/с'
+                )
+                if status != 304:
+                    self.stderr.write(f'{url}: ожидался ответ 304, '
+                                      f'получен {status}.')
@@ -0,0 +1,293 @@
+import json
+import statistics
+import subprocess
+from base64 import b64encode
+from datetime import datetime, timezone
+from io import BytesIO
+from time import perf_counter
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.benchmarking import DUMMY_CACHES, get_user
+from api.urls import router
+from recipes.models import (Favourite, Ingredient, Recipe, ShoppingCart,
+                            Tag)
+from users.models import CustomUser, Subscriber
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'), cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_image():
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), 'orange').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + b64encode(buffer.getvalue()).decode()
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время ответа и число SQL-запросов эндпоинтов API '
+            'и сохраняет отчёт в JSON для сравнения между коммитами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=20,
+            help='Количество повторов каждого сценария.'
+        )
+        parser.add_argument(
+            '--user',
+            help='Username пользователя, от имени которого выполняются '
+                 'запросы (по умолчанию пользователь с наибольшим '
+                 'числом подписок).'
+        )
+        parser.add_argument(
+            '--output',
+            default='benchmark.json',
+            help='Файл отчёта.'
+        )
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Отключить кеш на время замеров.'
+        )
+
+    def get_scenarios(self, user):
+        """Группы шагов: каждая группа повторяется целиком, и шаги,
+        меняющие данные, в ней же отменяются. Списки запрашиваются
+        с limit, как это делает фронтенд."""
+        recipes = list(Recipe.objects.exclude(author=user).exclude(
+            favouriting__user=user).exclude(
+            shopping_cart__user=user).values_list('pk', flat=True)[:10])
+        if not recipes:
+            raise CommandError('Нет рецептов для замеров.')
+        recipe = recipes[0]
+        author = CustomUser.objects.exclude(pk=user.pk).exclude(
+            subscribing__user=user).values_list('pk', flat=True).first()
+        tag = Tag.objects.first()
+        ingredients = list(Ingredient.objects.values_list('pk', flat=True)[:3])
+        bulk = {'recipes': recipes}
+        scenarios = [
+            [('users:list', 'get', '/api/users/?limit=6', None)],
+            [('users:detail', 'get', f'/api/users/{user.pk}/', None)],
+            [('users:me', 'get', '/api/users/me/', None)],
+            [('users:subscriptions', 'get',
+              '/api/users/subscriptions/?limit=6&recipes_limit=3', None)],
+            [('users:subscriptions:cursor', 'get',
+              '/api/users/subscriptions/?pagination=cursor&recipes_limit=3',
+              None)],
+            [('tags:list', 'get', '/api/tags/', None)],
+            [('tags:detail', 'get', f'/api/tags/{tag.pk}/', None)],
+            [('ingredients:list', 'get', '/api/ingredients/', None)],
+            [('ingredients:search', 'get', '/api/ingredients/?name=мо',
+              None)],
+            [('ingredients:detail', 'get',
+              f'/api/ingredients/{ingredients[0]}/', None)],
+            [('recipes:list', 'get', '/api/recipes/?limit=6', None)],
+            [('recipes:list:page', 'get', '/api/recipes/?page=2&limit=6',
+              None)],
+            [('recipes:list:cursor', 'get', '/api/recipes/?pagination=cursor',
+              None)],
+            [('recipes:list:tags', 'get',
+              f'/api/recipes/?limit=6&tags={tag.slug}', None)],
+            [('recipes:list:author', 'get',
+              f'/api/recipes/?limit=6&author={author}', None)],
+            [('recipes:list:favorited', 'get',
+              '/api/recipes/?limit=6&is_favorited=1', None)],
+            [('recipes:list:in_cart', 'get',
+              '/api/recipes/?limit=6&is_in_shopping_cart=1', None)],
+            [('recipes:feed', 'get', '/api/recipes/feed/', None)],
+            [('recipes:list:search', 'get',
+              '/api/recipes/?limit=6&search=суп', None)],
+            [('recipes:detail', 'get', f'/api/recipes/{recipe}/', None)],
+            [('recipes:download:txt', 'get',
+              '/api/recipes/download_shopping_cart/', None)],
+            [('recipes:download:csv', 'get',
+              '/api/recipes/download_shopping_cart/?file_format=csv', None)],
+            [('recipes:download:pdf', 'get',
+              '/api/recipes/download_shopping_cart/?file_format=pdf', None)],
+            [('recipes:favorite:add', 'post',
+              f'/api/recipes/{recipe}/favorite/', None),
+             ('recipes:favorite:remove', 'delete',
+              f'/api/recipes/{recipe}/favorite/', None)],
+            [('recipes:shopping_cart:add', 'post',
+              f'/api/recipes/{recipe}/shopping_cart/', None),
+             ('recipes:shopping_cart:remove', 'delete',
+              f'/api/recipes/{recipe}/shopping_cart/', None)],
+            [('recipes:favorite:bulk_add', 'post',
+              '/api/recipes/favorite/bulk/', bulk),
+             ('recipes:favorite:bulk_remove', 'delete',
+              '/api/recipes/favorite/bulk/', bulk)],
+            [('recipes:shopping_cart:bulk_add', 'post',
+              '/api/recipes/shopping_cart/bulk/', bulk),
+             ('recipes:shopping_cart:bulk_remove', 'delete',
+              '/api/recipes/shopping_cart/bulk/', bulk)],
+            [('recipes:create', 'post', '/api/recipes/', lambda state: {
+                'name': f'Бенчмарк {uuid4().hex}', 'text': 'Замер',
+                'cooking_time': 10, 'tags': [tag.pk],
+                'ingredients': [{'id': pk, 'amount': 10}
+                                for pk in ingredients],
+                'image': get_image()}),
+             ('recipes:update', 'patch',
+              lambda state: f'/api/recipes/{state["id"]}/',
+              lambda state: {
+                  'name': f'Бенчмарк {uuid4().hex}', 'text': 'Замер',
+                  'cooking_time': 20, 'tags': [tag.pk],
+                  'ingredients': [{'id': pk, 'amount': 20}
+                                  for pk in ingredients]}),
+             ('recipes:destroy', 'delete',
+              lambda state: f'/api/recipes/{state["id"]}/', None)],
+        ]
+        if author is not None:
+            scenarios.append(
+                [('users:subscribe', 'post',
+                  f'/api/users/{author}/subscribe/', None),
+                 ('users:unsubscribe', 'delete',
+                  f'/api/users/{author}/subscribe/', None)])
+        return scenarios
+
+    def get_admin_scenarios(self, admin, password):
+        """Группы шагов от имени временного администратора: вход
+        и выход, метрики и импорт рецептов."""
+        tag = Tag.objects.first()
+        ingredients = list(Ingredient.objects.values_list('pk', flat=True)[:3])
+
+        def import_line(state):
+            state['name'] = f'Импорт {uuid4().hex}'
+            return json.dumps({
+                'name': state['name'], 'text': 'Замер', 'cooking_time': 10,
+                'tags': [tag.pk],
+                'ingredients': [{'id': pk, 'amount': 10}
+                                for pk in ingredients],
+                'image': get_image()}).encode() + b'\n'
+
+        return [
+            [('auth:login', 'post', '/api/auth/token/login/',
+              {'email': admin.email, 'password': password}),
+             ('auth:logout', 'post', '/api/auth/token/logout/', None)],
+            [('metrics', 'get', '/api/metrics/', None)],
+            [('recipes:import', 'post', '/api/recipes/import/', import_line),
+             ('recipes:import:destroy', 'delete',
+              lambda state: '/api/recipes/{}/'.format(
+                  Recipe.objects.get(author=admin, name=state['name']).pk),
+              None)],
+        ]
+
+    def run_step(self, client, state, method, url, data):
+        if callable(url):
+            url = url(state)
+        if callable(data):
+            data = data(state)
+        with CaptureQueriesContext(connection) as queries:
+            start = perf_counter()
+            if isinstance(data, bytes):
+                response = getattr(client, method)(
+                    url, data, content_type='application/x-ndjson')
+            else:
+                response = getattr(client, method)(url, data, format='json')
+            if response.streaming:
+                size = sum(len(chunk) for chunk in response.streaming_content)
+            else:
+                size = len(response.content)
+            elapsed = perf_counter() - start
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{method.upper()} {url}: ответ {response.status_code}.')
+        if (not response.streaming and response.content
+                and response.get('Content-Type') == 'application/json'):
+            body = response.json()
+            if isinstance(body, dict) and 'id' in body:
+                state['id'] = body['id']
+        return url, elapsed, len(queries), size, response.status_code
+
+    def get_data_size(self):
+        return {
+            'users': CustomUser.objects.count(),
+            'recipes': Recipe.objects.count(),
+            'favorites': Favourite.objects.count(),
+            'shopping_carts': ShoppingCart.objects.count(),
+            'subscriptions': Subscriber.objects.count(),
+        }
+
+    def run_groups(self, groups, requests, results, covered):
+        for client, group in groups:
+            timings = {}
+            for _ in range(requests):
+                state = {}
+                for name, method, url, data in group:
+                    url, elapsed, queries, size, status = self.run_step(
+                        client, state, method, url, data)
+                    timings.setdefault(name, []).append(elapsed)
+                    results[name] = {
+                        'method': method.upper(),
+                        'url': url,
+                        'status': status,
+                        'queries': queries,
+                        'response_size': size,
+                    }
+                    covered.add(resolve(url.split('?')[0]).url_name)
+            for name, samples in timings.items():
+                samples_ms = [sample * 1000 for sample in samples]
+                results[name].update({
+                    'mean_ms': round(statistics.fmean(samples_ms), 2),
+                    'median_ms': round(statistics.median(samples_ms), 2),
+                    'p95_ms': round(
+                        statistics.quantiles(samples_ms, n=20)[-1]
+                        if len(samples_ms) > 1 else samples_ms[0], 2),
+                    'min_ms': round(min(samples_ms), 2),
+                })
+                self.stdout.write(
+                    f'{name:<36}{results[name]["median_ms"]:>10.2f} мс'
+                    f'{results[name]["queries"]:>6} запр.')
+
+    def handle(self, *args, **options):
+        user = get_user(options['user'])
+        client = APIClient()
+        client.force_authenticate(user)
+        password = uuid4().hex
+        admin = CustomUser.objects.create_user(
+            username=f'benchmark-{uuid4().hex[:8]}',
+            email=f'benchmark-{uuid4().hex[:8]}@example.com',
+            password=password, is_staff=True)
+        admin_client = APIClient()
+        admin_client.force_authenticate(admin)
+        groups = ([(client, group) for group in self.get_scenarios(user)]
+                  + [(admin_client, group) for group
+                     in self.get_admin_scenarios(admin, password)])
+        results, covered = {}, set()
+        caches = DUMMY_CACHES if options['no_cache'] else settings.CACHES
+        with override_settings(ALLOWED_HOSTS=['*'], CACHES=caches):
+            try:
+                self.run_groups(groups, options['requests'], results,
+                                covered)
+            finally:
+                admin.delete()
+        report = {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'commit': get_commit(),
+            'database': connection.vendor,
+            'cache': not options['no_cache'],
+            'requests': options['requests'],
+            'data': self.get_data_size(),
+            'endpoints': results,
+            'uncovered_routes': sorted(
+                {pattern.name for pattern in router.urls} - covered),
+        }
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2,
+                      sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(
+            f'Отчёт сохранён в {options["output"]}.'))
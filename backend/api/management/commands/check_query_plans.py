@@ -0,0 +1,77 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from api.benchmarking import (DUMMY_CACHES, capture_queries, explain,
+                              get_plan_urls, get_seq_scans, get_user)
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для запросов основных эндпоинтов и '
+            'завершается ошибкой, если в плане есть последовательное '
+            'сканирование большой таблицы. Запускается на PostgreSQL '
+            'с заполненной базой.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Username пользователя, от имени которого выполняются '
+                 'запросы (по умолчанию пользователь с наибольшим '
+                 'числом подписок).'
+        )
+        parser.add_argument(
+            '--min-rows',
+            type=int,
+            default=10000,
+            help='Таблицы с таким числом строк и больше считаются большими.'
+        )
+        parser.add_argument(
+            '--show-plans',
+            action='store_true',
+            help='Выводить планы всех запросов.'
+        )
+        parser.add_argument('urls', nargs='*')
+
+    def get_large_tables(self, min_rows):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            cursor.execute(
+                "SELECT relname FROM pg_class "
+                "WHERE relkind = 'r' AND reltuples >= %s", [min_rows])
+            return {name for name, in cursor.fetchall()}
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка планов работает только '
+                               'с PostgreSQL.')
+        user = get_user(options['user'])
+        large_tables = self.get_large_tables(options['min_rows'])
+        self.stdout.write('Большие таблицы: '
+                          f'{", ".join(sorted(large_tables)) or "нет"}.')
+        client = APIClient()
+        client.force_authenticate(user)
+        problems = 0
+        with override_settings(ALLOWED_HOSTS=['*'], CACHES=DUMMY_CACHES):
+            for url in options['urls'] or get_plan_urls(user):
+                response, queries = capture_queries(client, url)
+                if response.status_code != 200:
+                    raise CommandError(
+                        f'{url}: ответ {response.status_code}.')
+                self.stdout.write(f'{url}: запросов {len(queries)}')
+                for sql, params in queries:
+                    plan = explain(sql, params)
+                    if options['show_plans']:
+                        self.stdout.write(json.dumps(plan, indent=2))
+                    for table in get_seq_scans(plan):
+                        if table in large_tables:
+                            problems += 1
+                            self.stdout.write(self.style.ERROR(
+                                f'  Seq Scan по {table}: {sql[:200]}'))
+        if problems:
+            raise CommandError(
+                f'Найдено последовательных сканирований: {problems}.')
+        self.stdout.write(self.style.SUCCESS(
+            'Последовательных сканирований больших таблиц нет.'))
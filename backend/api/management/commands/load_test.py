@@ -0,0 +1,120 @@
+import json
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle
+from time import perf_counter
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+PATHS = (
+    '/api/recipes/?limit=6',
+    '/api/recipes/?page=2&limit=6',
+    '/api/tags/',
+    '/api/ingredients/?name=мо',
+)
+AUTH_PATHS = (
+    '/api/recipes/?limit=6&is_favorited=1',
+    '/api/recipes/download_shopping_cart/',
+)
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест запущенного сервера: заданное число '
+            'параллельных клиентов читает эндпоинты в течение заданного '
+            'времени. Если передано несколько адресов, например WSGI '
+            'и ASGI, результаты выводятся рядом для сравнения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('servers', nargs='+',
+                            help='Адреса серверов, например '
+                                 'http://127.0.0.1:8000.')
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=50,
+            help='Число параллельных клиентов.'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            help='Длительность теста каждого сервера в секундах.'
+        )
+        parser.add_argument(
+            '--token',
+            help='Токен пользователя: добавляет эндпоинты, '
+                 'требующие авторизации.'
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            dest='paths',
+            help='Адрес эндпоинта; можно указать несколько раз.'
+        )
+        parser.add_argument('--output', help='Файл отчёта в JSON.')
+
+    def run_client(self, server, paths, headers, deadline):
+        latencies, errors = [], 0
+        with requests.Session() as session:
+            session.headers.update(headers)
+            for path in cycle(paths):
+                if perf_counter() >= deadline:
+                    break
+                start = perf_counter()
+                try:
+                    response = session.get(server + path, timeout=30)
+                    failed = response.status_code >= 400
+                except requests.RequestException:
+                    failed = True
+                if failed:
+                    errors += 1
+                else:
+                    latencies.append(perf_counter() - start)
+        return latencies, errors
+
+    def run_server(self, server, paths, headers, options):
+        concurrency = options['concurrency']
+        deadline = perf_counter() + options['duration']
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(
+                lambda _: self.run_client(server, paths, headers, deadline),
+                range(concurrency)))
+        latencies = sorted(latency * 1000 for client_latencies, _ in results
+                           for latency in client_latencies)
+        if not latencies:
+            raise CommandError(f'{server}: нет успешных ответов.')
+        percentiles = statistics.quantiles(latencies, n=100)
+        return {
+            'requests': len(latencies),
+            'errors': sum(errors for _, errors in results),
+            'rps': round(len(latencies) / options['duration'], 1),
+            'median_ms': round(statistics.median(latencies), 2),
+            'p95_ms': round(percentiles[94], 2),
+            'p99_ms': round(percentiles[98], 2),
+            'max_ms': round(latencies[-1], 2),
+        }
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or PATHS
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+            if not options['paths']:
+                paths += AUTH_PATHS
+        report = {}
+        for server in options['servers']:
+            server = server.rstrip('/')
+            report[server] = self.run_server(server, paths, headers, options)
+            result = report[server]
+            self.stdout.write(
+                f'{server:<32}{result["rps"]:>10} запр./с'
+                f'{result["median_ms"]:>10} мс медиана'
+                f'{result["p99_ms"]:>10} мс p99'
+                f'{result["errors"]:>6} ошибок')
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({'concurrency': options['concurrency'],
+                           'duration': options['duration'],
+                           'paths': list(paths),
+                           'servers': report}, file, indent=2)
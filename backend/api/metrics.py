@@ -0,0 +1,223 @@
+from contextvars import ContextVar
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.fields import empty
+from rest_framework.permissions import BasePermission, IsAdminUser
+
+from foodgram.postgresql_pool.base import get_pool_stats
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2)
+
+HISTOGRAMS = {
+    'foodgram_request_duration_seconds': (
+        'Время обработки запроса.', DURATION_BUCKETS),
+    'foodgram_db_duration_seconds': (
+        'Время выполнения SQL-запросов.', DURATION_BUCKETS),
+    'foodgram_db_queries': (
+        'Число SQL-запросов.', QUERIES_BUCKETS),
+    'foodgram_serializer_duration_seconds': (
+        'Время сериализации ответа без SQL-запросов.', DURATION_BUCKETS),
+    'foodgram_validation_duration_seconds': (
+        'Время валидации данных запроса без SQL-запросов.',
+        DURATION_BUCKETS),
+    'foodgram_response_size_bytes': (
+        'Размер ответа.', SIZE_BUCKETS),
+}
+
+POOL_METRICS = (
+    ('pool_size', 'foodgram_db_pool_size', 'gauge',
+     'Соединений в пуле.'),
+    ('pool_available', 'foodgram_db_pool_available', 'gauge',
+     'Свободных соединений в пуле.'),
+    ('requests_waiting', 'foodgram_db_pool_waiting', 'gauge',
+     'Ожидающих соединения запросов.'),
+    ('requests_num', 'foodgram_db_pool_checkouts_total', 'counter',
+     'Выдано соединений из пула.'),
+    ('requests_queued', 'foodgram_db_pool_waits_total', 'counter',
+     'Выдач с ожиданием свободного соединения.'),
+    ('requests_wait_ms', 'foodgram_db_pool_wait_seconds_total', 'counter',
+     'Время ожидания свободного соединения.'),
+    ('requests_errors', 'foodgram_db_pool_timeouts_total', 'counter',
+     'Запросов соединения, не дождавшихся его.'),
+    ('connections_num', 'foodgram_db_pool_connections_total', 'counter',
+     'Открыто соединений с базой.'),
+    ('connections_ms', 'foodgram_db_pool_connect_seconds_total', 'counter',
+     'Время установки соединений с базой.'),
+    ('connections_errors', 'foodgram_db_pool_connect_errors_total',
+     'counter', 'Ошибок установки соединения.'),
+    ('checks_failed', 'foodgram_db_pool_checks_failed_total', 'counter',
+     'Соединений, не прошедших проверку при выдаче.'),
+)
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """Метрики одного запроса, собираемые по ходу его обработки."""
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.view = 'unresolved'
+        self.queries = 0
+        self.db_time = 0
+        self.timers = {'serializer': 0, 'validation': 0}
+        self.running = set()
+
+    def server_timing(self, duration):
+        timing = [f'db;desc="SQL: {self.queries}";'
+                  f'dur={self.db_time * 1000:.1f}']
+        timing += [f'{name};dur={value * 1000:.1f}'
+                   for name, value in self.timers.items()]
+        timing.append(f'total;dur={duration * 1000:.1f}')
+        return ', '.join(timing)
+
+    def observe(self, duration, size):
+        registry.observe(self.view, {
+            'foodgram_request_duration_seconds': duration,
+            'foodgram_db_duration_seconds': self.db_time,
+            'foodgram_db_queries': self.queries,
+            'foodgram_serializer_duration_seconds': self.timers['serializer'],
+            'foodgram_validation_duration_seconds': (
+                self.timers['validation']),
+            'foodgram_response_size_bytes': size,
+        })
+
+
+class MetricsRegistry:
+    """Гистограммы метрик по представлениям в памяти процесса."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.values = {}
+
+    def observe(self, view, observations):
+        with self.lock:
+            for name, value in observations.items():
+                buckets = HISTOGRAMS[name][1]
+                counts, total = self.values.get(
+                    (name, view), ([0] * (len(buckets) + 1), 0))
+                index = next((number for number, bound in enumerate(buckets)
+                              if value <= bound), len(buckets))
+                counts[index] += 1
+                self.values[name, view] = counts, total + value
+
+    def render(self):
+        """Гистограммы в текстовом формате Prometheus."""
+        with self.lock:
+            values = {key: (list(counts), total)
+                      for key, (counts, total) in self.values.items()}
+        lines = []
+        for name, (description, buckets) in HISTOGRAMS.items():
+            lines += [f'# HELP {name} {description}',
+                      f'# TYPE {name} histogram']
+            for (metric, view), (counts, total) in sorted(values.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{view="{view}",'
+                                 f'le="{bound}"}} {cumulative}')
+                lines += [f'{name}_sum{{view="{view}"}} {total}',
+                          f'{name}_count{{view="{view}"}} {cumulative}']
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def render_pool_stats():
+    """Статистика пулов соединений в текстовом формате Prometheus."""
+    stats = get_pool_stats()
+    if not stats:
+        return ''
+    lines = []
+    for key, name, kind, description in POOL_METRICS:
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        for alias, values in sorted(stats.items()):
+            value = values.get(key, 0)
+            if key.endswith('_ms'):
+                value /= 1000
+            lines.append(f'{name}{{alias="{alias}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def measure_queries(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += perf_counter() - start
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    # Обёртка ставится первой: connection.execute_wrapper() снимает
+    # последнюю обёртку списка и не должен снять эту.
+    if measure_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, measure_queries)
+
+
+@contextmanager
+def measure(name):
+    """Учитывает время блока в метрике запроса за вычетом SQL-запросов.
+
+    Вложенные блоки с тем же именем (сериализатор внутри сериализатора)
+    не считаются повторно."""
+    metrics = current_metrics.get()
+    if metrics is None or name in metrics.running:
+        yield
+        return
+    metrics.running.add(name)
+    start, db_time = perf_counter(), metrics.db_time
+    try:
+        yield
+    finally:
+        metrics.timers[name] += (perf_counter() - start
+                                 - (metrics.db_time - db_time))
+        metrics.running.discard(name)
+
+
+class TimedSerializerMixin:
+    """Учитывает в метриках запроса время сериализации и валидации.
+
+    Подмешивается только к сериализаторам проекта: сериализаторы
+    djoser и других пакетов не замеряются. Список замеряется через
+    элементы или через собственный list_serializer_class с миксином."""
+
+    def to_representation(self, instance):
+        with measure('serializer'):
+            return super().to_representation(instance)
+
+    def run_validation(self, data=empty):
+        with measure('validation'):
+            return super().run_validation(data)
+
+
+class HasMetricsToken(BasePermission):
+    """Доступ по токену METRICS_TOKEN в заголовке Authorization: Bearer."""
+
+    def has_permission(self, request, view):
+        keyword, _, token = request.headers.get(
+            'Authorization', '').partition(' ')
+        return bool(settings.METRICS_TOKEN and keyword == 'Bearer'
+                    and constant_time_compare(token, settings.METRICS_TOKEN))
+
+
+@api_view(['GET'])
+@permission_classes((HasMetricsToken | IsAdminUser,))
+def metrics(request):
+    return HttpResponse(registry.render() + render_pool_stats(),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
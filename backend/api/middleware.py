@@ -0,0 +1,157 @@
+import random
+from time import perf_counter
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+
+from api.metrics import RequestMetrics, current_metrics
+from api.replicas import choose_read_database, read_database, stick_to_primary
+
+
+class PerformanceMetricsMiddleware:
+    """Собирает метрики производительности для доли запросов.
+
+    Число и время SQL-запросов, время сериализации и валидации и размер
+    ответа отдаются в заголовке Server-Timing и попадают в гистограммы
+    по представлениям DRF (например, RecipeViewSet.list). У потоковых
+    ответов заголовок учитывает только время до начала отдачи, а
+    гистограммы обновляются после её окончания.
+
+    Работает и в синхронной, и в асинхронной цепочке middleware, чтобы
+    под ASGI асинхронные представления не переводились в поток."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if random.random() >= settings.PERFORMANCE_SAMPLE_RATE:
+            return self.get_response(request)
+        metrics = RequestMetrics()
+        request.performance_metrics = metrics
+        token = current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.process_metrics(metrics, response)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.PERFORMANCE_SAMPLE_RATE:
+            return await self.get_response(request)
+        metrics = RequestMetrics()
+        request.performance_metrics = metrics
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.process_metrics(metrics, response)
+
+    def process_metrics(self, metrics, response):
+        response['Server-Timing'] = metrics.server_timing(
+            perf_counter() - metrics.start)
+        if not response.streaming:
+            metrics.observe(perf_counter() - metrics.start,
+                            len(response.content))
+        elif response.is_async:
+            response.streaming_content = self.ameasure_stream(
+                metrics, response.streaming_content)
+        else:
+            response.streaming_content = self.measure_stream(
+                metrics, response.streaming_content)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = getattr(request, 'performance_metrics', None)
+        if metrics is not None:
+            metrics.view = get_view_name(request, view_func)
+
+    def measure_stream(self, metrics, content):
+        size = 0
+        iterator = iter(content)
+        try:
+            while True:
+                token = current_metrics.set(metrics)
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    current_metrics.reset(token)
+                size += len(chunk)
+                yield chunk
+        finally:
+            metrics.observe(perf_counter() - metrics.start, size)
+
+    async def ameasure_stream(self, metrics, content):
+        size = 0
+        iterator = content.__aiter__()
+        try:
+            while True:
+                token = current_metrics.set(metrics)
+                try:
+                    chunk = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    current_metrics.reset(token)
+                size += len(chunk)
+                yield chunk
+        finally:
+            metrics.observe(perf_counter() - metrics.start, size)
+
+
+class ReplicaRoutingMiddleware:
+    """Выбирает базу для чтения на время запроса.
+
+    После успешного изменяющего запроса пользователь на
+    REPLICA_STICKY_SECONDS закрепляется за основной базой."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = read_database.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_database.reset(token)
+        stick_to_primary(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = read_database.set(None)
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_database.reset(token)
+        await sync_to_async(stick_to_primary)(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        read_database.set(choose_read_database(request, view_func))
+
+
+def get_view_name(request, view_func):
+    """Имя представления DRF с действием или имя маршрута Django."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return request.resolver_match.view_name
+    method = request.method.lower()
+    action = (getattr(view_func, 'actions', None) or {}).get(method, method)
+    return f'{view_class.__name__}.{action}'
@@ -1,9 +1,60 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 from foodgram.settings import LIMIT
 
 
+class CustomCursorPaginator(CursorPagination):
+    """Курсорная пагинация без подсчёта объектов и OFFSET."""
+    page_size = LIMIT
+    page_size_query_param = 'limit'
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+
+
 class CustomPageNumberPaginator(PageNumberPagination):
-    """Паджинатор для вывода на странице ограниченного числа элементов."""
+    """Паджинатор для вывода на странице ограниченного числа элементов.
+
+    Если задан cursor_ordering, клиент может перейти на курсорную
+    пагинацию параметром pagination=cursor."""
     page_size_query_param = 'limit'
     limit = LIMIT
+    cursor_ordering = None
+    cursor_paginator = None
+
+    def is_cursor_requested(self, request):
+        return self.cursor_ordering is not None and (
+            request.query_params.get('pagination') == 'cursor'
+            or 'cursor' in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.is_cursor_requested(request):
+            self.cursor_paginator = CustomCursorPaginator(
+                self.cursor_ordering)
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        self.cursor_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePaginator(CustomPageNumberPaginator):
+    """Паджинатор ленты рецептов: курсор по дате публикации и id."""
+    cursor_ordering = ('-pub_date', '-id')
+
+
+class FeedPaginator(CustomCursorPaginator):
+    """Курсорная пагинация ленты подписок по дате публикации и id."""
+
+    def __init__(self):
+        super().__init__(('-feed_pub_date', '-id'))
+
+
+class UserPaginator(CustomPageNumberPaginator):
+    """Паджинатор пользователей и подписок: курсор по username."""
+    cursor_ordering = ('username',)
@@ -0,0 +1,66 @@
+import random
+from contextvars import ContextVar
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+read_database = ContextVar('read_database', default=None)
+
+
+def get_sticky_key(request):
+    """Ключ закрепления за основной базой по токену авторизации."""
+    authorization = request.headers.get('Authorization')
+    if not authorization:
+        return None
+    return f'replica:primary:{sha256(authorization.encode()).hexdigest()}'
+
+
+def choose_read_database(request, view_func):
+    """Реплика для запроса или None, если читать нужно с основной базы.
+
+    С реплик читают только безопасные запросы к вьюсетам с атрибутом
+    replica_reads. Пользователь, недавно изменивший данные, читает
+    с основной базы, чтобы сразу видеть свои изменения."""
+    if not settings.DATABASE_REPLICAS or request.method not in SAFE_METHODS:
+        return None
+    if not getattr(getattr(view_func, 'cls', None), 'replica_reads', False):
+        return None
+    key = get_sticky_key(request)
+    if key is not None and cache.get(key):
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def stick_to_primary(request, response):
+    """Закрепляет пользователя за основной базой после изменения данных."""
+    if request.method in SAFE_METHODS or response.status_code >= 400:
+        return
+    key = get_sticky_key(request)
+    if key is not None:
+        cache.set(key, True, timeout=settings.REPLICA_STICKY_SECONDS)
+
+
+class ReplicaRouter:
+    """Направляет чтение выбранной для запроса реплике, запись —
+    в основную базу.
+
+    Внутри транзакции чтение идёт в основную базу, чтобы видеть
+    ещё не зафиксированные изменения. Токены тоже читаются с основной
+    базы: только что выданный токен мог ещё не попасть на реплику."""
+
+    def db_for_read(self, model, **hints):
+        database = read_database.get()
+        if (database is None or model._meta.app_label == 'authtoken'
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return None
+        return database
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база.
+        return True
@@ -1,19 +1,31 @@
+from base64 import b64encode
+
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
+from django.db.models import Manager, Prefetch, prefetch_related_objects
 from drf_extra_fields.fields import Base64ImageField
 from djoser.serializers import UserSerializer as UserDjoserSerializer
 from djoser.serializers import UserCreateSerializer
 # from rest_framework.relations import SlugRelatedField
-from rest_framework.serializers import (ModelSerializer,
+from rest_framework.serializers import (ModelSerializer, ListSerializer,
                                         SerializerMethodField, ReadOnlyField,
                                         PrimaryKeyRelatedField, IntegerField,
-                                        ValidationError)
-
+                                        ValidationError, Serializer,
+                                        ListField)
+
+from api.cache import bump_cache_version, get_cache_versions
+from api.metrics import TimedSerializerMixin
+from api.utils import (download_image, fan_out_recipes, update_counter,
+                       update_recipe_in_shopping_lists, update_search_vectors)
+from recipes.images import (delete_image_files, get_image_files,
+                            schedule_image_processing)
 from users.models import CustomUser, Subscriber
 from recipes.models import (Tag, Ingredient, Recipe, IngredientRecipes,
-                            ShoppingCart, Favourite)
+                            ShoppingCart, Favourite, TagRecipes)
 
 
-class UserSerializer(UserDjoserSerializer):
+class UserSerializer(TimedSerializerMixin, UserDjoserSerializer):
     """Сериализатор для вывода модели кастомного пользователя."""
     is_subscribed = SerializerMethodField(
         'get_is_subscribed',
@@ -24,6 +36,8 @@ class UserSerializer(UserDjoserSerializer):
         user = self.context['request'].user
         if user.is_anonymous:
             return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Subscriber.objects.filter(user=user, author=obj).exists()
 
     class Meta:
@@ -32,28 +46,53 @@ class UserSerializer(UserDjoserSerializer):
                   'last_name', 'is_subscribed')
 
 
-class TagSerializer(ModelSerializer):
+class TagSerializer(TimedSerializerMixin, ModelSerializer):
     """Сериализатор тегов."""
     class Meta:
         model = Tag
         fields = '__all__'
 
 
-class IngredientSerializer(ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, ModelSerializer):
     """Сериализатор ингредиентов."""
     class Meta:
         model = Ingredient
         fields = '__all__'
 
 
-class RecipeSubscribSerializer(ModelSerializer):
+class RecipeImageVariantsMixin:
+    """Ссылки на уменьшенную и WebP-версии картинки рецепта.
+
+    Пока версии готовятся, вместо них отдаётся исходная картинка."""
+    def get_image_url(self, obj, variant):
+        image = getattr(obj, variant) or obj.image
+        if not image:
+            return None
+        request = self.context.get('request')
+        if request is None:
+            return image.url
+        return request.build_absolute_uri(image.url)
+
+    def get_image_thumbnail(self, obj):
+        return self.get_image_url(obj, 'image_thumbnail')
+
+    def get_image_webp(self, obj):
+        return self.get_image_url(obj, 'image_webp')
+
+
+class RecipeSubscribSerializer(TimedSerializerMixin, RecipeImageVariantsMixin,
+                               ModelSerializer):
     """Сериализатор рецепта короткого вида."""
+    image_thumbnail = SerializerMethodField('get_image_thumbnail')
+    image_webp = SerializerMethodField('get_image_webp')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_thumbnail', 'image_webp',
+                  'cooking_time')
 
 
-class IngredientRecipesSerializer(ModelSerializer):
+class IngredientRecipesSerializer(TimedSerializerMixin, ModelSerializer):
     """Сериализатор промежуточной модели ингредиентов в рецептах."""
     id = PrimaryKeyRelatedField(
         queryset=Ingredient.objects.all(),
@@ -66,7 +105,8 @@ class IngredientRecipesSerializer(ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class IngredientRecipeCreateSerializer(ModelSerializer):
+class IngredientRecipeCreateSerializer(TimedSerializerMixin,
+                                       ModelSerializer):
     """Сериализатор промежуточной модели ингредиентов в рецептах
     для создания рецепта."""
     id = PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
@@ -77,11 +117,41 @@ class IngredientRecipeCreateSerializer(ModelSerializer):
         fields = ('id', 'amount')
 
 
-class RecipeListSerializer(ModelSerializer):
-    """Сериализатор вывода списка рецептов."""
+RECIPE_DATA_PREFETCH = (
+    'tags',
+    Prefetch('ingredient_used',
+             queryset=IngredientRecipes.objects.select_related('ingredient')),
+)
+
+
+class CachedRecipeListSerializer(TimedSerializerMixin, ListSerializer):
+    """Сериализатор списка рецептов, читающий кеш одним запросом
+    на всю страницу."""
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        self.child.load_cached(recipes)
+        # Связанные объекты загружаются только для рецептов,
+        # которых нет в кеше.
+        prefetch_related_objects(
+            [recipe for recipe in recipes
+             if self.child.cache_keys[recipe.pk] not in self.child.cached],
+            *RECIPE_DATA_PREFETCH
+        )
+        return super().to_representation(recipes)
+
+
+class RecipeListSerializer(TimedSerializerMixin, RecipeImageVariantsMixin,
+                           ModelSerializer):
+    """Сериализатор вывода списка рецептов.
+
+    Не зависящая от пользователя часть представления кешируется
+    по версиям рецепта, автора, тегов и ингредиентов; флаги текущего
+    пользователя подставляются при каждом ответе."""
     tags = TagSerializer(many=True, read_only=True)
     author = UserSerializer(read_only=True)
     image = Base64ImageField()
+    image_thumbnail = SerializerMethodField('get_image_thumbnail')
+    image_webp = SerializerMethodField('get_image_webp')
     ingredients = IngredientRecipesSerializer(many=True,
                                               source='ingredient_used')
     is_favorited = SerializerMethodField('get_is_favorited')
@@ -91,23 +161,73 @@ class RecipeListSerializer(ModelSerializer):
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'image_thumbnail',
+                  'image_webp', 'text', 'cooking_time')
+        list_serializer_class = CachedRecipeListSerializer
+
+    cache_keys = None
+    cached = None
+
+    def get_cache_keys(self, recipes):
+        request = self.context.get('request')
+        versions = get_cache_versions(
+            ['tag', 'ingredient']
+            + [f'recipe:{recipe.pk}' for recipe in recipes]
+            + [f'user:{recipe.author_id}' for recipe in recipes]
+        )
+        suffix = (f'{versions["tag"][0]}:{versions["ingredient"][0]}:'
+                  f'{request.get_host() if request else ""}')
+        return {
+            recipe.pk: (f'recipe-data:{recipe.pk}:'
+                        f'{versions[f"recipe:{recipe.pk}"][0]}:'
+                        f'{versions[f"user:{recipe.author_id}"][0]}:{suffix}')
+            for recipe in recipes
+        }
+
+    def load_cached(self, recipes):
+        self.cache_keys = self.get_cache_keys(recipes)
+        self.cached = cache.get_many(self.cache_keys.values())
+
+    def to_representation(self, instance):
+        if self.cache_keys is None or instance.pk not in self.cache_keys:
+            self.load_cached([instance])
+        key = self.cache_keys[instance.pk]
+        data = self.cached.get(key)
+        if data is None:
+            # У рецептов страницы связи уже подгружены списком, здесь
+            # они загружаются для одиночного рецепта (retrieve, ответ
+            # на создание и изменение).
+            prefetch_related_objects([instance], *RECIPE_DATA_PREFETCH)
+            data = super().to_representation(instance)
+            cache.set(key, data, settings.API_CACHE_TIMEOUT)
+        data = dict(data)
+        data['author'] = dict(
+            data['author'],
+            is_subscribed=self.fields['author'].get_is_subscribed(
+                instance.author)
+        )
+        data['is_favorited'] = self.get_is_favorited(instance)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(instance)
+        return data
 
     def get_is_favorited(self, obj):
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return Favourite.objects.filter(user=user, recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return ShoppingCart.objects.filter(user=user, recipe=obj).exists()
 
 
-class RecipeCreateUpdateSerializer(ModelSerializer):
+class RecipeCreateUpdateSerializer(TimedSerializerMixin, ModelSerializer):
     """Сериализатор создания и редактуры рецепта."""
     tags = PrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
     image = Base64ImageField()
@@ -154,11 +274,72 @@ class RecipeCreateUpdateSerializer(ModelSerializer):
         IngredientRecipes.objects.bulk_create(
             [IngredientRecipes(recipe=recipe,
                                amount=ingredient['amount'],
-                               ingredient=Ingredient.objects.get(
-                                   id=ingredient['id']))
+                               ingredient=ingredient['id'])
              for ingredient in ingredients]
         )
 
+    def update_ingredients(self, recipe, ingredients):
+        """Применяет к ингредиентам рецепта только отличия от новых.
+
+        Возвращает True, если что-то изменилось."""
+        new_amounts = {ingredient['id'].pk: ingredient['amount']
+                       for ingredient in ingredients}
+        old_amounts, kept, to_update, to_delete = {}, {}, [], []
+        for row in IngredientRecipes.objects.filter(recipe=recipe):
+            old_amounts[row.ingredient_id] = (
+                old_amounts.get(row.ingredient_id, 0) + row.amount)
+            if (row.ingredient_id not in new_amounts
+                    or row.ingredient_id in kept):
+                to_delete.append(row.pk)
+                continue
+            kept[row.ingredient_id] = row
+            if row.amount != new_amounts[row.ingredient_id]:
+                row.amount = new_amounts[row.ingredient_id]
+                to_update.append(row)
+        to_create = [
+            IngredientRecipes(recipe=recipe, ingredient_id=ingredient_id,
+                              amount=amount)
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in kept
+        ]
+        if to_delete:
+            IngredientRecipes.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            IngredientRecipes.objects.bulk_update(to_update, ('amount',))
+        if to_create:
+            IngredientRecipes.objects.bulk_create(to_create)
+        update_recipe_in_shopping_lists(recipe, old_amounts, new_amounts)
+        return bool(to_delete or to_update or to_create)
+
+    def update_tags(self, recipe, tags):
+        """Добавляет новые и удаляет снятые теги рецепта.
+
+        Возвращает True, если что-то изменилось."""
+        new_ids = {tag.pk for tag in tags}
+        old_ids = set(TagRecipes.objects.filter(recipe=recipe).values_list(
+            'tag', flat=True))
+        if old_ids - new_ids:
+            TagRecipes.objects.filter(
+                recipe=recipe, tag__in=old_ids - new_ids).delete()
+        if new_ids - old_ids:
+            TagRecipes.objects.bulk_create(
+                TagRecipes(recipe=recipe, tag_id=tag_id)
+                for tag_id in new_ids - old_ids)
+        return old_ids != new_ids
+
+    @staticmethod
+    def is_same_image(image, content):
+        """Совпадает ли загруженная картинка с уже сохранённой."""
+        try:
+            if not image or image.size != content.size:
+                return False
+            with image.open('rb'):
+                same = image.read() == content.read()
+        except OSError:
+            return False
+        content.seek(0)
+        return same
+
     @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredient_used')
@@ -166,14 +347,38 @@ class RecipeCreateUpdateSerializer(ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         self.create_ingredients(ingredients, recipe)
+        update_search_vectors([recipe.pk])
+        update_counter(CustomUser, [recipe.author_id], 'recipes_count')
+        fan_out_recipes([recipe])
+        schedule_image_processing(recipe)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredient_used')
-        IngredientRecipes.objects.filter(recipe=instance).delete()
-        self.create_ingredients(ingredients, instance)
-        return super().update(instance, validated_data)
+        """Записывает в базу только изменившиеся поля и связи рецепта."""
+        ingredients_changed = self.update_ingredients(
+            instance, validated_data.pop('ingredient_used'))
+        tags_changed = self.update_tags(instance, validated_data.pop('tags'))
+        image = validated_data.pop('image', None)
+        changed_fields = [field for field, value in validated_data.items()
+                          if getattr(instance, field) != value]
+        for field in changed_fields:
+            setattr(instance, field, validated_data[field])
+        if image is not None and not self.is_same_image(instance.image,
+                                                        image):
+            delete_image_files(get_image_files(instance.pk))
+            instance.image = image
+            instance.image_thumbnail = None
+            instance.image_webp = None
+            changed_fields += ['image', 'image_thumbnail', 'image_webp']
+            schedule_image_processing(instance)
+        if changed_fields:
+            instance.save(update_fields=changed_fields)
+        if ingredients_changed or {'name', 'text'} & set(changed_fields):
+            update_search_vectors([instance.pk])
+        if ingredients_changed or tags_changed or changed_fields:
+            bump_cache_version(f'recipe:{instance.pk}')
+        return instance
 
     def to_representation(self, instance):
         request = self.context.get('request')
@@ -181,7 +386,50 @@ class RecipeCreateUpdateSerializer(ModelSerializer):
                                     context={'request': request}).data
 
 
-class ShoppingCartSerializer(ModelSerializer):
+class PreloadedPrimaryKeyField(PrimaryKeyRelatedField):
+    """Поле первичного ключа, которое ищет объект в заранее загруженном
+    словаре из контекста, а не отдельным запросом к базе."""
+    def __init__(self, context_key, **kwargs):
+        self.context_key = context_key
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        try:
+            return self.context[self.context_key][int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class ImportImageField(Base64ImageField):
+    """Картинка в base64 или ссылка на неё."""
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith(('http://',
+                                                      'https://')):
+            data = b64encode(download_image(data)).decode()
+        return super().to_internal_value(data)
+
+
+class IngredientRecipeImportSerializer(IngredientRecipeCreateSerializer):
+    """Сериализатор ингредиента рецепта при импорте."""
+    id = PreloadedPrimaryKeyField('ingredients',
+                                  queryset=Ingredient.objects.all())
+
+
+class RecipeImportSerializer(RecipeCreateUpdateSerializer):
+    """Сериализатор проверки рецепта при импорте.
+
+    Правила те же, что и при создании рецепта через API, но теги
+    и ингредиенты ищутся в словарях из контекста."""
+    tags = PreloadedPrimaryKeyField('tags', queryset=Tag.objects.all(),
+                                    many=True)
+    image = ImportImageField()
+    ingredients = IngredientRecipeImportSerializer(many=True,
+                                                   source='ingredient_used')
+
+
+class ShoppingCartSerializer(TimedSerializerMixin, ModelSerializer):
     """Сериализатор списка покупок."""
     user = IntegerField(source='user.id')
     recipe = IntegerField(source='recipe.id')
@@ -200,10 +448,18 @@ class ShoppingCartSerializer(ModelSerializer):
         return data
 
 
+class RecipeIdsSerializer(TimedSerializerMixin, Serializer):
+    """Сериализатор списка id рецептов для пакетных операций."""
+    recipes = ListField(child=IntegerField(min_value=1), allow_empty=False,
+                        max_length=settings.BULK_RECIPES_LIMIT)
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
 class SubscribedSerializer(UserSerializer):
     """Сериализатор подписок пользователя."""
     recipes = SerializerMethodField('get_recipes')
-    recipes_count = IntegerField(source='recipes.count', read_only=True)
 
     class Meta:
         model = CustomUser
@@ -211,6 +467,9 @@ class SubscribedSerializer(UserSerializer):
                   'is_subscribed', 'recipes', 'recipes_count')
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'limited_recipes'):
+            return RecipeSubscribSerializer(obj.limited_recipes,
+                                            many=True, read_only=True).data
         request = self.context.get('request')
         recipes = obj.recipes.all()
         limit = request.GET.get('recipes_limit')
@@ -231,7 +490,7 @@ class SubscribedSerializer(UserSerializer):
         return data
 
 
-class FavoriteSerializer(ModelSerializer):
+class FavoriteSerializer(TimedSerializerMixin, ModelSerializer):
     """Сериализатор издранного."""
     user = IntegerField(source='user.id')
     recipe = IntegerField(source='recipe.id')
@@ -254,7 +513,7 @@ class FavoriteSerializer(ModelSerializer):
         return validated_data
 
 
-class UserCreateSerializer(UserCreateSerializer):
+class UserCreateSerializer(TimedSerializerMixin, UserCreateSerializer):
     """Сериализатор для создания пользователя."""
     class Meta:
         model = CustomUser
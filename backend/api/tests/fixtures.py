@@ -0,0 +1,38 @@
+from api.utils import fan_out_recipes
+from recipes.models import (Favourite, Ingredient, IngredientRecipes, Recipe,
+                            ShoppingCart, Tag, TagRecipes)
+from users.models import CustomUser, Subscriber
+
+
+def create_recipes(count):
+    """Автор с рецептами, у каждого два тега и три ингредиента,
+    и читатель, который подписан на автора, видит рецепты в ленте
+    и отметил часть из них."""
+    author = CustomUser.objects.create_user(
+        username='author', email='author@example.com', password='password')
+    reader = CustomUser.objects.create_user(
+        username='reader', email='reader@example.com', password='password')
+    tags = Tag.objects.bulk_create(
+        Tag(name=f'Тег {number}', color=f'#00000{number}',
+            slug=f'tag-{number}')
+        for number in range(2))
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+        for number in range(3))
+    recipes = Recipe.objects.bulk_create(
+        Recipe(author=author, name=f'Рецепт {number}', text='Текст',
+               cooking_time=10)
+        for number in range(count))
+    TagRecipes.objects.bulk_create(
+        TagRecipes(recipe=recipe, tag=tag)
+        for recipe in recipes for tag in tags)
+    IngredientRecipes.objects.bulk_create(
+        IngredientRecipes(recipe=recipe, ingredient=ingredient, amount=10)
+        for recipe in recipes for ingredient in ingredients)
+    Favourite.objects.bulk_create(
+        Favourite(user=reader, recipe=recipe) for recipe in recipes[::2])
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user=reader, recipe=recipe) for recipe in recipes[::3])
+    Subscriber.objects.create(user=reader, author=author)
+    fan_out_recipes(recipes)
+    return author, reader, recipes
@@ -0,0 +1,54 @@
+from django.contrib.admin.sites import site
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from api.tests.fixtures import create_recipes
+from api.utils import add_to_shopping_list, get_live_shopping_lists
+from recipes.models import Recipe, ShoppingCart, ShoppingListItem
+from users.models import CustomUser
+
+
+class AdminBulkDeleteTest(TestCase):
+    """Массовое удаление в админке обновляет списки покупок и счётчики
+    числом запросов, не зависящим от числа удаляемых записей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader, cls.recipes = create_recipes(12)
+        add_to_shopping_list(cls.reader, ShoppingCart.objects.filter(
+            user=cls.reader).values('recipe'))
+        CustomUser.objects.filter(pk=cls.author.pk).update(recipes_count=12)
+        Recipe.objects.filter(shopping_cart__isnull=False).update(
+            in_carts_count=1)
+
+    def assertListsMatchCarts(self):
+        self.assertEqual(
+            set(ShoppingListItem.objects.values_list(
+                'user', 'ingredient', 'amount')),
+            set(get_live_shopping_lists()))
+
+    def delete(self, model, queryset):
+        with CaptureQueriesContext(connection) as queries:
+            site._registry[model].delete_queryset(None, queryset)
+        return len(queries)
+
+    def test_recipes(self):
+        pks = [recipe.pk for recipe in self.recipes]
+        first = self.delete(Recipe, Recipe.objects.filter(pk__in=pks[:3]))
+        second = self.delete(Recipe, Recipe.objects.filter(pk__in=pks[3:9]))
+        self.assertEqual(first, second)
+        self.assertListsMatchCarts()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 3)
+
+    def test_shopping_carts(self):
+        carts = list(ShoppingCart.objects.values_list('pk', flat=True))
+        first = self.delete(ShoppingCart,
+                            ShoppingCart.objects.filter(pk__in=carts[:1]))
+        second = self.delete(ShoppingCart,
+                             ShoppingCart.objects.filter(pk__in=carts[1:]))
+        self.assertEqual(first, second)
+        self.assertListsMatchCarts()
+        self.assertEqual(
+            Recipe.objects.filter(in_carts_count__gt=0).count(), 0)
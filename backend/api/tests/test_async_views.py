@@ -0,0 +1,57 @@
+from asgiref.sync import async_to_sync
+from django.test import override_settings
+from rest_framework.test import (APIRequestFactory, APITestCase,
+                                 force_authenticate)
+
+from api.async_views import async_read_view
+from api.benchmarking import DUMMY_CACHES
+from api.tests.fixtures import create_recipes
+from recipes.views import RecipeViewSet
+
+
+async def get_response(view, request, **kwargs):
+    response = await view(request, **kwargs)
+    if response.streaming:
+        [chunk async for chunk in response.streaming_content]
+    return response
+
+
+@override_settings(CACHES=DUMMY_CACHES)
+class AsyncReadViewsTest(APITestCase):
+    """Асинхронные представления отвечают так же, как синхронный
+    вьюсет: с теми же правами, фильтрами и ошибками."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader, cls.recipes = create_recipes(2)
+
+    def assertSameStatus(self, view, url, user=None, **kwargs):
+        request = APIRequestFactory().get(url)
+        if user is not None:
+            self.client.force_authenticate(user)
+            force_authenticate(request, user)
+        response = async_to_sync(get_response)(view, request, **kwargs)
+        self.assertEqual(response.status_code,
+                         self.client.get(url).status_code)
+        return response.status_code
+
+    def test_download_shopping_cart(self):
+        view = async_read_view(
+            RecipeViewSet, {'get': 'download_shopping_cart'},
+            **RecipeViewSet.download_shopping_cart.kwargs)
+        url = '/api/recipes/download_shopping_cart/'
+        self.assertEqual(self.assertSameStatus(view, url), 401)
+        self.assertEqual(
+            self.assertSameStatus(view, url, user=self.reader), 200)
+
+    def test_retrieve(self):
+        view = async_read_view(RecipeViewSet, {'get': 'retrieve'})
+        pk = self.recipes[0].pk
+        for url, kwargs, status in (
+            (f'/api/recipes/{pk}/', {'pk': pk}, 200),
+            (f'/api/recipes/{pk}/?author={self.reader.pk}', {'pk': pk}, 404),
+            ('/api/recipes/0/', {'pk': 0}, 404),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.assertSameStatus(view, url, **kwargs), status)
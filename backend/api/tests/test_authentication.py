@@ -0,0 +1,37 @@
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from api.authentication import local_tokens
+from api.benchmarking import DUMMY_CACHES
+from api.utils import update_counter
+from users.models import CustomUser
+
+
+@override_settings(CACHES=DUMMY_CACHES)
+class CachedTokenAuthenticationTest(APITestCase):
+    """Изменяющие запросы работают со свежим пользователем, а не
+    с копией из кеша токенов."""
+
+    def setUp(self):
+        local_tokens.clear()
+        self.addCleanup(local_tokens.clear)
+        self.user = CustomUser.objects.create_user(
+            username='author', email='author@example.com',
+            password='password')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_profile_update_with_cached_token(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        self.assertIsNotNone(local_tokens.get(self.user.auth_token.key))
+        CustomUser.objects.filter(pk=self.user.pk).update(last_name='Иванов')
+        update_counter(CustomUser, [self.user.pk], 'recipes_count')
+        response = self.client.patch('/api/users/me/',
+                                     {'first_name': 'Иван'})
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(
+            (self.user.first_name, self.user.last_name,
+             self.user.recipes_count),
+            ('Иван', 'Иванов', 1))
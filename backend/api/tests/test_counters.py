@@ -0,0 +1,46 @@
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from api.benchmarking import DUMMY_CACHES
+from api.tests.fixtures import create_recipes
+from api.utils import update_counter
+from users.models import CustomUser
+
+
+@override_settings(CACHES=DUMMY_CACHES)
+class CountersTest(APITestCase):
+    """Сохранение объекта не перезаписывает счётчики, изменённые
+    другими запросами."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader, cls.recipes = create_recipes(1)
+        cls.other = CustomUser.objects.create_user(
+            username='other', email='other@example.com', password='password')
+
+    def test_profile_update_keeps_counters(self):
+        author = CustomUser.objects.get(pk=self.author.pk)
+        self.client.force_authenticate(self.other)
+        response = self.client.post(f'/api/users/{author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+        update_counter(CustomUser, [author.pk], 'recipes_count')
+        self.client.force_authenticate(author)
+        response = self.client.patch('/api/users/me/',
+                                     {'first_name': 'Автор'})
+        self.assertEqual(response.status_code, 200)
+        author.refresh_from_db()
+        self.assertEqual(
+            (author.first_name, author.recipes_count,
+             author.subscribers_count),
+            ('Автор', 1, 1))
+
+    def test_recipe_save_keeps_counters(self):
+        recipe = self.recipes[0]
+        self.client.force_authenticate(self.other)
+        response = self.client.post(f'/api/recipes/{recipe.pk}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        recipe.name = 'Новое название'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual((recipe.name, recipe.favorites_count),
+                         ('Новое название', 1))
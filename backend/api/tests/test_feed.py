@@ -0,0 +1,61 @@
+from unittest import mock
+
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from api.tests.fixtures import create_recipes
+from api.utils import (feed_executor, fill_author_feeds,
+                       fill_author_feeds_in_thread, remove_subscribers)
+from recipes.models import FeedEntry, Recipe
+from users.models import CustomUser, Subscriber
+
+
+class FeedTest(APITestCase):
+    """Лента подписок читается из записей ленты и из рецептов авторов
+    с большим числом подписчиков в одном и том же порядке."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader, cls.recipes = create_recipes(8)
+        cls.expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id').values_list('pk', flat=True))
+
+    def setUp(self):
+        self.client.force_authenticate(self.reader)
+
+    def get_feed_ids(self):
+        ids, url = [], '/api/recipes/feed/?limit=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_feed_from_entries(self):
+        self.assertEqual(self.get_feed_ids(), self.expected)
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_feed_of_popular_author(self):
+        FeedEntry.objects.all().delete()
+        CustomUser.objects.filter(pk=self.author.pk).update(
+            subscribers_count=1)
+        self.assertEqual(self.get_feed_ids(), self.expected)
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_fill_feeds_when_author_drops_below_limit(self):
+        other = CustomUser.objects.create_user(
+            username='other', email='other@example.com', password='password')
+        Subscriber.objects.create(user=other, author=self.author)
+        CustomUser.objects.filter(pk=self.author.pk).update(
+            subscribers_count=2)
+        FeedEntry.objects.all().delete()
+        Subscriber.objects.filter(user=other).delete()
+        with mock.patch.object(feed_executor, 'submit') as submit, \
+                self.captureOnCommitCallbacks(execute=True):
+            remove_subscribers(self.author.pk)
+        submit.assert_called_once_with(fill_author_feeds_in_thread,
+                                       self.author.pk)
+        fill_author_feeds(self.author.pk)
+        self.assertEqual(self.get_feed_ids(), self.expected)
+        self.assertFalse(FeedEntry.objects.filter(user=other).exists())
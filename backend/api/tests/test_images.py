@@ -0,0 +1,82 @@
+import shutil
+from base64 import b64encode
+from io import BytesIO
+from tempfile import mkdtemp
+from unittest import mock
+
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from api.benchmarking import DUMMY_CACHES
+from api.tests.fixtures import create_recipes
+from recipes.images import executor, process_recipe_image
+from recipes.models import Ingredient, Recipe, Tag
+
+MEDIA_ROOT = mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=DUMMY_CACHES)
+class RecipeImageTest(APITestCase):
+    """При смене картинки рецепта файлы прежней картинки и её копий
+    удаляются после фиксации транзакции."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, _, (cls.recipe,) = create_recipes(1)
+
+    def get_image(self, color):
+        buffer = BytesIO()
+        Image.new('RGB', (2, 2), color).save(buffer, 'PNG')
+        return ('data:image/png;base64,'
+                + b64encode(buffer.getvalue()).decode())
+
+    def get_files(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        files = [recipe.image, recipe.image_thumbnail, recipe.image_webp]
+        for file in files:
+            self.assertTrue(file.storage.exists(file.name))
+        return files
+
+    def upload(self, color):
+        """Загружает картинку и строит её копии, как это сделал бы
+        пул потоков."""
+        self.patch_image(color)
+        process_recipe_image(self.recipe.pk)
+        return self.get_files()
+
+    def patch_image(self, color):
+        self.client.force_authenticate(self.author)
+        with mock.patch.object(executor, 'submit'), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.pk}/', {
+                    'name': self.recipe.name, 'text': self.recipe.text,
+                    'cooking_time': self.recipe.cooking_time,
+                    'image': self.get_image(color),
+                    'tags': list(Tag.objects.values_list('pk', flat=True)),
+                    'ingredients': [
+                        {'id': pk, 'amount': 10} for pk
+                        in Ingredient.objects.values_list('pk', flat=True)
+                    ],
+                }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_old_files_deleted(self):
+        old_files = self.upload('red')
+        new_files = self.upload('blue')
+        for file in old_files:
+            self.assertFalse(file.storage.exists(file.name))
+        self.assertEqual(len({file.name for file in old_files + new_files}),
+                         6)
+
+    def test_same_image_kept(self):
+        old_files = self.upload('red')
+        self.patch_image('red')
+        self.assertEqual([file.name for file in self.get_files()],
+                         [file.name for file in old_files])
@@ -0,0 +1,66 @@
+import json
+import shutil
+from base64 import b64encode
+from io import BytesIO
+from tempfile import mkdtemp
+
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from api.imports import RecipeImporter
+from api.tests.fixtures import create_recipes
+from recipes.models import Ingredient, Recipe, Tag
+
+MEDIA_ROOT = mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeImporterTest(TestCase):
+    """Импорт делит строки на пачки по числу строк и по размеру."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader, _ = create_recipes(1)
+        buffer = BytesIO()
+        Image.new('RGB', (1, 1)).save(buffer, 'PNG')
+        cls.image = ('data:image/png;base64,'
+                     + b64encode(buffer.getvalue()).decode())
+
+    def get_line(self, name, text='Текст'):
+        return json.dumps({
+            'name': name, 'text': text, 'cooking_time': 10,
+            'tags': [Tag.objects.first().pk],
+            'ingredients': [{'id': Ingredient.objects.first().pk,
+                             'amount': 10}],
+            'image': self.image,
+        }) + '\n'
+
+    def run_import(self, lines, batch_size=500):
+        checkpoints, rejected = [], []
+        importer = RecipeImporter(
+            self.reader, batch_size,
+            on_reject=lambda number, line, errors: rejected.append(number),
+            on_checkpoint=checkpoints.append)
+        importer.run(lines)
+        return checkpoints, rejected
+
+    def test_batch_size(self):
+        lines = [self.get_line(f'Рецепт {number}') for number in range(5)]
+        self.assertEqual(self.run_import(lines, batch_size=2),
+                         ([2, 4, 5], []))
+        self.assertEqual(Recipe.objects.filter(author=self.reader).count(),
+                         5)
+
+    @override_settings(RECIPE_IMPORT_BATCH_BYTES=1000)
+    def test_batch_bytes(self):
+        lines = [self.get_line(f'Рецепт {number}', 'a' * 600)
+                 for number in range(5)]
+        lines.insert(1, self.get_line('Рецепт 0'))
+        self.assertEqual(self.run_import(lines), ([2, 4, 6], [2]))
+        self.assertEqual(Recipe.objects.filter(author=self.reader).count(),
+                         5)
@@ -0,0 +1,39 @@
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from api.benchmarking import DUMMY_CACHES
+from api.indexes import normalize
+from recipes.models import Ingredient
+
+
+@override_settings(CACHES=DUMMY_CACHES)
+class IngredientSearchTest(APITestCase):
+    """Поиск по индексу в памяти отдаёт ингредиенты в том же порядке,
+    что и база."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г') for name in (
+                'сахар', 'Сахарин', 'сахарная пудра', 'Сахар ванильный',
+                'Ёж', 'ежевика', 'Мёд'
+            )
+        )
+
+    def search(self, name):
+        response = self.client.get('/api/ingredients/', {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.data]
+
+    def expected(self, name):
+        return [ingredient.name for ingredient in Ingredient.objects.all()
+                if normalize(ingredient.name).startswith(normalize(name))]
+
+    def test_order(self):
+        for name in ('сахар', 'САХАРИН', 'еж', 'ё', 'м', 'нет'):
+            with self.subTest(name=name):
+                self.assertEqual(self.search(name), self.expected(name))
+
+    def test_matches(self):
+        self.assertEqual(len(self.search('Сахар')), 4)
+        self.assertEqual(len(self.search('ёж')), 2)
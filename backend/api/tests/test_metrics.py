@@ -0,0 +1,39 @@
+from django.test import TestCase
+from rest_framework.serializers import CharField, Serializer
+
+from api.metrics import RequestMetrics, current_metrics
+from api.serializers import TagSerializer
+from recipes.models import Tag
+
+
+class PlainSerializer(Serializer):
+    name = CharField()
+
+
+class SerializerTimersTest(TestCase):
+    """Время сериализации и валидации учитывается только
+    для сериализаторов проекта."""
+
+    def measure(self, function):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            function()
+        finally:
+            current_metrics.reset(token)
+        return metrics.timers
+
+    def test_project_serializers(self):
+        tags = [Tag(id=1, name='Завтрак', color='#000000', slug='breakfast')]
+        timers = self.measure(
+            lambda: TagSerializer(tags, many=True).data)
+        self.assertGreater(timers['serializer'], 0)
+        timers = self.measure(lambda: TagSerializer(data={
+            'name': 'Обед', 'color': '#000001', 'slug': 'lunch'}).is_valid())
+        self.assertGreater(timers['validation'], 0)
+
+    def test_other_serializers(self):
+        self.assertEqual(self.measure(lambda: (
+            PlainSerializer({'name': 'Тег'}).data,
+            PlainSerializer(data={'name': 'Тег'}).is_valid(),
+        )), {'serializer': 0, 'validation': 0})
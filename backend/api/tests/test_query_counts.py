@@ -0,0 +1,29 @@
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from api.benchmarking import DUMMY_CACHES
+from api.tests.fixtures import create_recipes
+
+
+@override_settings(CACHES=DUMMY_CACHES)
+class RecipeListQueriesTest(APITestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader, cls.recipes = create_recipes(60)
+
+    def assertListQueries(self, number):
+        for url in ('/api/recipes/?limit=6', '/api/recipes/?limit=60'):
+            with self.subTest(url=url), self.assertNumQueries(number):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']),
+                                 int(url.rsplit('=', 1)[1]))
+
+    def test_anonymous(self):
+        self.assertListQueries(5)
+
+    def test_authenticated(self):
+        self.client.force_authenticate(self.reader)
+        self.assertListQueries(5)
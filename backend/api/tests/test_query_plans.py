@@ -0,0 +1,41 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from api.benchmarking import (DUMMY_CACHES, capture_queries, explain,
+                              get_plan_urls, get_seq_scans)
+from api.tests.fixtures import create_recipes
+
+# Справочники читаются целиком и кешируются, индекс им не нужен.
+REFERENCE_TABLES = {'recipes_tag', 'recipes_ingredient'}
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Планы запросов проверяются на PostgreSQL.')
+@override_settings(CACHES=DUMMY_CACHES)
+class QueryPlansTest(APITestCase):
+    """Запросы основных эндпоинтов обслуживаются индексами.
+
+    Последовательное сканирование запрещено настройкой enable_seqscan,
+    поэтому Seq Scan остаётся в плане, только если подходящего индекса
+    нет, и результат не зависит от объёма тестовых данных."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader, cls.recipes = create_recipes(60)
+
+    def test_no_seq_scans(self):
+        self.client.force_authenticate(self.reader)
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        for url in get_plan_urls(self.author):
+            with self.subTest(url=url):
+                response, queries = capture_queries(self.client, url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual([
+                    (table, sql) for sql, params in queries
+                    for table in get_seq_scans(explain(sql, params))
+                    if table not in REFERENCE_TABLES
+                ], [])
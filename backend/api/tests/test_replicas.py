@@ -0,0 +1,73 @@
+from time import time
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITransactionTestCase
+
+from api.authentication import local_tokens
+from api.replicas import read_database
+from api.tests.fixtures import create_recipes
+
+
+@skipUnless('replica_1' in settings.DATABASES,
+            'Реплика не настроена: задайте DB_REPLICAS.')
+@override_settings(
+    DATABASE_REPLICAS=['replica_1'],
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'replicas-test',
+    }},
+)
+class ReplicaRoutingTest(APITransactionTestCase):
+    """Чтение идёт с реплики, запись и чтение сразу после неё —
+    с основной базы.
+
+    Используется APITransactionTestCase: внутри транзакции теста
+    роутер читал бы с основной базы."""
+    # Без реплики класс пропускается, но набор баз всё равно читается
+    # при подготовке тестовых баз.
+    databases = {'default'} | ({'replica_1'} & set(settings.DATABASES))
+
+    def setUp(self):
+        cache.clear()
+        local_tokens.clear()
+        self.addCleanup(local_tokens.clear)
+        self.author, self.reader, self.recipes = create_recipes(2)
+        token = Token.objects.create(user=self.reader)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        # Токен попадает в кеш и дальше не читается из базы.
+        self.client.get('/api/users/me/')
+
+    def count_queries(self, method, url):
+        with CaptureQueriesContext(connections['default']) as default, \
+                CaptureQueriesContext(connections['replica_1']) as replica:
+            response = getattr(self.client, method)(url)
+        self.assertLess(response.status_code, 400)
+        self.assertIsNone(read_database.get())
+        return len(default), len(replica)
+
+    def test_reads_go_to_replica(self):
+        default, replica = self.count_queries('get', '/api/users/?limit=6')
+        self.assertEqual(default, 0)
+        self.assertGreater(replica, 0)
+
+    def test_writes_go_to_default_and_stick(self):
+        url = f'/api/recipes/{self.recipes[1].pk}/shopping_cart/'
+        default, replica = self.count_queries('post', url)
+        self.assertGreater(default, 0)
+        self.assertEqual(replica, 0)
+        default, replica = self.count_queries('get', '/api/users/?limit=6')
+        self.assertGreater(default, 0)
+        self.assertEqual(replica, 0)
+        expired = time() + settings.REPLICA_STICKY_SECONDS + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time',
+                        return_value=expired):
+            default, replica = self.count_queries(
+                'get', '/api/users/?limit=6')
+        self.assertEqual(default, 0)
+        self.assertGreater(replica, 0)
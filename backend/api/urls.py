@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from api.async_views import async_read_view
+from api.metrics import metrics
 from recipes.views import TagViewSet, IngredientViewSet, RecipeViewSet
 from users.views import UserViewSet
 
@@ -13,7 +16,36 @@ router.register('tags', TagViewSet)
 router.register('ingredients', IngredientViewSet)
 router.register('recipes', RecipeViewSet)
 
+DETAIL_ACTIONS = {'get': 'retrieve', 'put': 'update',
+                  'patch': 'partial_update', 'delete': 'destroy'}
+
+# Асинхронные представления для чтения стоят перед маршрутами роутера
+# и перехватывают те же адреса.
+async_read_urls = [
+    path('recipes/',
+         async_read_view(RecipeViewSet, {'get': 'list', 'post': 'create'}),
+         name='recipes-list'),
+    path('recipes/download_shopping_cart/',
+         async_read_view(RecipeViewSet, {'get': 'download_shopping_cart'},
+                         **RecipeViewSet.download_shopping_cart.kwargs),
+         name='recipes-download-shopping-cart'),
+    path('recipes/<int:pk>/',
+         async_read_view(RecipeViewSet, DETAIL_ACTIONS),
+         name='recipes-detail'),
+    path('tags/', async_read_view(TagViewSet, {'get': 'list'}),
+         name='tags-list'),
+    path('tags/<int:pk>/', async_read_view(TagViewSet, {'get': 'retrieve'}),
+         name='tags-detail'),
+    path('ingredients/', async_read_view(IngredientViewSet, {'get': 'list'}),
+         name='ingredients-list'),
+    path('ingredients/<int:pk>/',
+         async_read_view(IngredientViewSet, {'get': 'retrieve'}),
+         name='ingredients-detail'),
+]
+
 urlpatterns = [
+    path('metrics/', metrics, name='metrics'),
+    *(async_read_urls if settings.ASYNC_READ_API else ()),
     path('', include(router.urls)),
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
@@ -1,28 +1,473 @@
+import csv
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from io import BytesIO
 
-from django.http import HttpResponse
-from django.db.models import Sum
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.http import StreamingHttpResponse
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+import requests
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.exceptions import ValidationError
 
-from recipes.models import IngredientRecipes
+from recipes.models import (FeedEntry, Favourite, IngredientRecipes, Recipe,
+                            ShoppingCart,
+                            ShoppingListItem)
+from users.models import CustomUser, Subscriber
 
+logger = logging.getLogger(__name__)
 
-def get_shopping_cart(user):
-    """Функция скачивания списка покупок."""
-    ingredients = IngredientRecipes.objects.filter(
-        recipe__shopping_cart__user=user
-    ).values('ingredient__name', 'ingredient__measurement_unit').annotate(
-        amount=Sum('amount')
+feed_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='feeds')
+
+
+def update_search_vectors(recipes):
+    """Пересчитывает поисковый документ рецептов одним запросом:
+    название, ингредиенты и описание с убывающим весом.
+
+    Поисковый документ строится средствами PostgreSQL, на других базах
+    (SQLite для локальной разработки) он не заполняется."""
+    if connection.vendor != 'postgresql':
+        return
+    config = settings.SEARCH_CONFIG
+    ingredient_names = IngredientRecipes.objects.filter(
+        recipe=OuterRef('pk')
+    ).values('recipe').annotate(
+        names=StringAgg('ingredient__name', delimiter=' ')
+    ).values('names')
+    Recipe.objects.filter(pk__in=recipes).update(search_vector=(
+        SearchVector('name', weight='A', config=config)
+        + SearchVector(Subquery(ingredient_names), weight='B', config=config)
+        + SearchVector('text', weight='C', config=config)
+    ))
+
+
+def download_image(url):
+    """Скачивает картинку по ссылке с ограничением размера и времени."""
+    max_size = settings.RECIPE_IMPORT_IMAGE_MAX_SIZE
+    try:
+        with requests.get(url, stream=True,
+                          timeout=settings.RECIPE_IMPORT_IMAGE_TIMEOUT
+                          ) as response:
+            response.raise_for_status()
+            content = b''
+            for chunk in response.iter_content(64 * 1024):
+                content += chunk
+                if len(content) > max_size:
+                    raise ValidationError(
+                        f'Картинка больше {max_size} байт.')
+    except requests.RequestException as error:
+        raise ValidationError(f'Не удалось скачать картинку: {error}')
+    return content
+
+
+def get_recipes_amounts(recipes):
+    """Суммарное количество каждого ингредиента в рецептах."""
+    return dict(
+        IngredientRecipes.objects.filter(recipe__in=recipes).values_list(
+            'ingredient'
+        ).annotate(total=Sum('amount')).order_by()
     )
-    data_shopping_cart = datetime.today()
-    list_shopping = ('Список покупок из рецептов от '
-                     f'{data_shopping_cart:%d.%m.%Y}\n')
-    list_shopping += '\n'.join([
-        f'- {ingredient["ingredient__name"]}'
-        f'({ingredient["ingredient__measurement_unit"]}) : '
-        f'{ingredient["amount"]}'
-        for ingredient in ingredients
-    ])
-    file = 'shopping_cart.txt'
-    response = HttpResponse(list_shopping, content_type='text/plain')
+
+
+def get_live_shopping_lists():
+    """Списки покупок, посчитанные напрямую по рецептам в корзинах."""
+    return IngredientRecipes.objects.filter(
+        recipe__shopping_cart__isnull=False
+    ).values_list('recipe__shopping_cart__user', 'ingredient').annotate(
+        total=Sum('amount')
+    ).order_by()
+
+
+@transaction.atomic
+def update_shopping_lists(deltas):
+    """Применяет изменения {(user_id, ingredient_id): delta}
+    к сводным спискам покупок."""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    user_ids = sorted({user_id for user_id, _ in deltas})
+    # Блокировка пользователей упорядочивает параллельные изменения
+    # одного списка покупок.
+    list(CustomUser.objects.select_for_update().filter(
+        id__in=user_ids).order_by('id').values_list('id'))
+    items = {
+        (item.user_id, item.ingredient_id): item
+        for item in ShoppingListItem.objects.filter(
+            user_id__in=user_ids,
+            ingredient_id__in={ingredient_id for _, ingredient_id in deltas}
+        )
+    }
+    to_create, to_update, to_delete = [], [], []
+    for (user_id, ingredient_id), delta in deltas.items():
+        item = items.get((user_id, ingredient_id))
+        if item is None:
+            if delta > 0:
+                to_create.append(ShoppingListItem(
+                    user_id=user_id, ingredient_id=ingredient_id,
+                    amount=delta))
+            continue
+        item.amount += delta
+        if item.amount > 0:
+            to_update.append(item)
+        else:
+            to_delete.append(item.id)
+    ShoppingListItem.objects.bulk_create(to_create)
+    ShoppingListItem.objects.bulk_update(to_update, ['amount'])
+    ShoppingListItem.objects.filter(id__in=to_delete).delete()
+
+
+def add_to_shopping_list(user, recipes, sign=1):
+    """Учитывает рецепты, добавленные в список покупок."""
+    update_shopping_lists({
+        (user.id, ingredient_id): sign * amount
+        for ingredient_id, amount in get_recipes_amounts(recipes).items()
+    })
+
+
+def remove_from_shopping_list(user, recipes):
+    """Учитывает рецепты, удалённые из списка покупок."""
+    add_to_shopping_list(user, recipes, sign=-1)
+
+
+def update_recipe_in_shopping_lists(recipe, old_amounts, new_amounts=None):
+    """Переносит изменение ингредиентов рецепта в списки покупок
+    всех пользователей, у которых он в корзине."""
+    if new_amounts is None:
+        new_amounts = get_recipes_amounts([recipe])
+    changes = {
+        ingredient_id: (new_amounts.get(ingredient_id, 0)
+                        - old_amounts.get(ingredient_id, 0))
+        for ingredient_id in set(old_amounts) | set(new_amounts)
+    }
+    changes = {key: delta for key, delta in changes.items() if delta}
+    if not changes:
+        return
+    user_ids = ShoppingCart.objects.filter(recipe=recipe).values_list(
+        'user', flat=True)
+    update_shopping_lists({
+        (user_id, ingredient_id): delta
+        for user_id in user_ids
+        for ingredient_id, delta in changes.items()
+    })
+
+
+def remove_carts_from_shopping_lists(carts):
+    """Убирает удаляемые записи корзины из списков покупок: изменения
+    всех списков считаются одним запросом."""
+    update_shopping_lists({
+        (user_id, ingredient_id): -total
+        for user_id, ingredient_id, total in IngredientRecipes.objects.filter(
+            recipe__shopping_cart__in=carts
+        ).values_list('recipe__shopping_cart__user', 'ingredient').annotate(
+            total=Sum('amount')
+        ).order_by()
+    })
+
+
+def remove_recipe_from_shopping_lists(recipe):
+    """Убирает удаляемый рецепт из списков покупок."""
+    remove_recipes_from_shopping_lists([recipe])
+
+
+def remove_recipes_from_shopping_lists(recipes):
+    """Убирает удаляемые рецепты из списков покупок."""
+    remove_carts_from_shopping_lists(
+        ShoppingCart.objects.filter(recipe__in=recipes))
+
+
+def fan_out_recipes(recipes):
+    """Добавляет новые рецепты в ленты подписчиков их авторов.
+
+    Рецепты авторов, у которых подписчиков больше FEED_FANOUT_LIMIT,
+    не раскладываются по лентам, а выбираются при их чтении."""
+    author_recipes = {}
+    for recipe in recipes:
+        author_recipes.setdefault(recipe.author_id, []).append(recipe)
+    subscriptions = Subscriber.objects.filter(
+        author__in=author_recipes,
+        author__subscribers_count__lte=settings.FEED_FANOUT_LIMIT,
+    ).values_list('user', 'author')
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe.pk,
+                   pub_date=recipe.pub_date)
+         for user_id, author_id in subscriptions.iterator()
+         for recipe in author_recipes[author_id]),
+        batch_size=settings.FEED_BATCH_SIZE, ignore_conflicts=True)
+
+
+def add_to_feed(user_id, author_id):
+    """Добавляет в ленту пользователя рецепты автора после подписки."""
+    recipes = Recipe.objects.filter(
+        author_id=author_id,
+        author__subscribers_count__lte=settings.FEED_FANOUT_LIMIT,
+    ).values_list('pk', 'pub_date')
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+         for recipe_id, pub_date in recipes.iterator()),
+        batch_size=settings.FEED_BATCH_SIZE, ignore_conflicts=True)
+
+
+def remove_from_feed(user_id, author_id):
+    """Убирает из ленты пользователя рецепты автора после отписки."""
+    FeedEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id).delete()
+
+
+def fill_author_feeds(author_id):
+    """Раскладывает все рецепты автора по лентам его подписчиков."""
+    recipes = list(Recipe.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'))
+    users = Subscriber.objects.filter(author_id=author_id).values_list(
+        'user', flat=True)
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+         for user_id in users.iterator()
+         for recipe_id, pub_date in recipes),
+        batch_size=settings.FEED_BATCH_SIZE, ignore_conflicts=True)
+
+
+def fill_author_feeds_in_thread(author_id):
+    """Заполнение лент в потоке пула: соединение потока с базой
+    закрывается, как в конце запроса."""
+    close_old_connections()
+    try:
+        fill_author_feeds(author_id)
+    except Exception:
+        logger.exception('Не удалось заполнить ленты подписчиков автора %s',
+                         author_id)
+    finally:
+        close_old_connections()
+
+
+def remove_subscribers(author_id, count=1):
+    """Уменьшает счётчик подписчиков автора.
+
+    Если подписчиков стало не больше FEED_FANOUT_LIMIT, рецепты автора
+    перестают выбираться при чтении ленты, поэтому после фиксации
+    транзакции они раскладываются по лентам подписчиков в пуле потоков.
+    Записей может быть много (подписчики на рецепты), и ответ на запрос
+    их не ждёт: пока ленты заполняются, старые рецепты автора в них
+    не видны."""
+    update_counter(CustomUser, [author_id], 'subscribers_count', -count)
+    subscribers = CustomUser.objects.filter(pk=author_id).values_list(
+        'subscribers_count', flat=True).first()
+    limit = settings.FEED_FANOUT_LIMIT
+    if subscribers is not None and subscribers <= limit < subscribers + count:
+        transaction.on_commit(lambda: feed_executor.submit(
+            fill_author_feeds_in_thread, author_id))
+
+
+def get_feed(queryset, user):
+    """Рецепты ленты подписок пользователя с датой публикации
+    feed_pub_date, по которой лента сортируется.
+
+    Если пользователь не подписан на авторов с числом подписчиков больше
+    FEED_FANOUT_LIMIT, лента читается по индексу записей ленты
+    (user, -pub_date). Иначе к записям ленты добавляются рецепты таких
+    авторов, и сортировка идёт по дате публикации рецептов."""
+    popular_authors = list(Subscriber.objects.filter(
+        user=user,
+        author__subscribers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).values_list('author', flat=True))
+    if not popular_authors:
+        return queryset.filter(feed_entries__user=user).annotate(
+            feed_pub_date=F('feed_entries__pub_date'))
+    in_feed = Exists(FeedEntry.objects.filter(user=user,
+                                              recipe=OuterRef('pk')))
+    return queryset.filter(
+        Q(in_feed) | Q(author__in=popular_authors)
+    ).annotate(feed_pub_date=F('pub_date'))
+
+
+# Счётчики: модель, поле счётчика, связанная модель и её поле,
+# указывающее на объект со счётчиком.
+COUNTERS = (
+    (Recipe, 'favorites_count', Favourite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (CustomUser, 'recipes_count', Recipe, 'author'),
+    (CustomUser, 'subscribers_count', Subscriber, 'author'),
+)
+
+RECIPE_COUNTERS = {
+    Favourite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+
+def update_counter(model, pks, field, delta=1):
+    """Атомарно меняет счётчик объектов на delta одним запросом."""
+    if pks and delta:
+        model.objects.filter(pk__in=pks).update(
+            **{field: Greatest(F(field) + delta, 0)})
+
+
+def update_counters(model, deltas, field):
+    """Меняет счётчики объектов по словарю {pk: delta}: один запрос
+    на каждое различное значение delta."""
+    pks = {}
+    for pk, delta in deltas.items():
+        pks.setdefault(delta, []).append(pk)
+    for delta, group in pks.items():
+        update_counter(model, group, field, delta)
+
+
+def count_subquery(model, field):
+    """Подзапрос с фактическим количеством связанных объектов."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+def get_shopping_list(user):
+    return ShoppingListItem.objects.filter(user=user).values(
+        'ingredient__name', 'ingredient__measurement_unit', 'amount'
+    ).order_by('ingredient__name')
+
+
+def get_shopping_cart_ingredients(user):
+    """Итератор по сводному списку ингредиентов из списка покупок.
+
+    Строки читаются серверным курсором порциями, без загрузки
+    всего списка в память."""
+    return get_shopping_list(user).iterator(
+        chunk_size=settings.SHOPPING_CART_CHUNK_SIZE
+    )
+
+
+def get_shopping_cart_title():
+    return ('Список покупок из рецептов от '
+            f'{datetime.today():%d.%m.%Y}')
+
+
+def render_shopping_cart_txt(ingredients, title=True):
+    if title:
+        yield get_shopping_cart_title() + '\n'
+    for ingredient in ingredients:
+        yield (f'- {ingredient["ingredient__name"]}'
+               f'({ingredient["ingredient__measurement_unit"]}) : '
+               f'{ingredient["amount"]}\n')
+
+
+class Echo:
+    """Псевдобуфер для csv.writer, возвращающий записанную строку."""
+    def write(self, value):
+        return value
+
+
+def render_shopping_cart_csv(ingredients, title=True):
+    writer = csv.writer(Echo())
+    if title:
+        yield writer.writerow(('Ингредиент', 'Единица измерения',
+                               'Количество'))
+    for ingredient in ingredients:
+        yield writer.writerow((ingredient['ingredient__name'],
+                               ingredient['ingredient__measurement_unit'],
+                               ingredient['amount']))
+
+
+def render_shopping_cart_pdf(ingredients):
+    """Рендер PDF через reportlab.
+
+    Формат PDF требует таблицы смещений в конце файла, поэтому документ
+    собирается в буфере и отдаётся частями после сборки."""
+    font = 'ShoppingCartFont'
+    if font not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(font, settings.SHOPPING_CART_FONT))
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    _, height = A4
+    margin, line_height = 50, 18
+    pdf.setFont(font, 16)
+    pdf.drawString(margin, height - margin, get_shopping_cart_title())
+    pdf.setFont(font, 12)
+    position = height - margin - 2 * line_height
+    for ingredient in ingredients:
+        if position < margin:
+            pdf.showPage()
+            pdf.setFont(font, 12)
+            position = height - margin
+        pdf.drawString(margin, position,
+                       f'- {ingredient["ingredient__name"]}'
+                       f'({ingredient["ingredient__measurement_unit"]}) : '
+                       f'{ingredient["amount"]}')
+        position -= line_height
+    pdf.save()
+    buffer.seek(0)
+    while True:
+        chunk = buffer.read(settings.SHOPPING_CART_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+SHOPPING_CART_FORMATS = {
+    'txt': (render_shopping_cart_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_shopping_cart_csv, 'text/csv; charset=utf-8'),
+    'pdf': (render_shopping_cart_pdf, 'application/pdf'),
+}
+
+
+def get_shopping_cart_format(file_format):
+    if file_format not in SHOPPING_CART_FORMATS:
+        raise ValidationError({
+            'file_format': 'Доступные форматы: '
+                           f'{", ".join(SHOPPING_CART_FORMATS)}.'
+        })
+    return SHOPPING_CART_FORMATS[file_format]
+
+
+def make_shopping_cart_response(content, content_type, file_format):
+    response = StreamingHttpResponse(content, content_type=content_type)
+    file = f'shopping_cart.{file_format}'
     response['Content-Disposition'] = f'attachment; filename={file}'
     return response
+
+
+def get_shopping_cart(user, file_format='txt'):
+    """Функция скачивания списка покупок."""
+    renderer, content_type = get_shopping_cart_format(file_format)
+    return make_shopping_cart_response(
+        renderer(get_shopping_cart_ingredients(user)), content_type,
+        file_format)
+
+
+async def render_shopping_cart_async(renderer, file_format, rows):
+    if file_format == 'pdf':
+        ingredients = [row async for row in rows]
+        for chunk in await sync_to_async(
+                lambda: list(renderer(ingredients)))():
+            yield chunk
+        return
+    batch, title = [], True
+    async for row in rows:
+        batch.append(row)
+        if len(batch) == settings.SHOPPING_CART_CHUNK_SIZE:
+            yield ''.join(renderer(batch, title))
+            batch, title = [], False
+    yield ''.join(renderer(batch, title))
+
+
+def get_shopping_cart_async(user, file_format='txt'):
+    """Скачивание списка покупок для асинхронных представлений.
+
+    Строки читаются порциями без блокировки цикла событий, поэтому
+    медленный клиент не занимает поток на время скачивания.
+    PDF собирается целиком в потоке, как и в синхронном варианте.
+    Запрос строится до ответа, чтобы ошибка в нём не оборвала уже
+    начатое скачивание."""
+    renderer, content_type = get_shopping_cart_format(file_format)
+    rows = get_shopping_list(user).aiterator(
+        chunk_size=settings.SHOPPING_CART_CHUNK_SIZE)
+    return make_shopping_cart_response(
+        render_shopping_cart_async(renderer, file_format, rows),
+        content_type, file_format)
@@ -0,0 +1,99 @@
+from threading import Lock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+from psycopg import Error, IsolationLevel
+from psycopg_pool import ConnectionPool
+
+pools = {}
+pools_lock = Lock()
+failed_checks = {}
+
+
+def get_pool_stats():
+    """Статистика пулов процесса для экспорта метрик."""
+    with pools_lock:
+        items = list(pools.items())
+    return {alias: dict(pool.get_stats(),
+                        checks_failed=failed_checks.get(alias, 0))
+            for (alias, _), pool in items}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с пулом соединений psycopg_pool.
+
+    Соединение берётся из пула процесса при подключении и возвращается
+    в него при закрытии, поэтому запрос не тратит время на установку
+    соединения и аутентификацию. Настройки пула задаются в
+    OPTIONS['pool']: min_size, max_size, timeout, max_idle, а check
+    включает проверку соединения запросом SELECT 1 при выдаче."""
+
+    def get_pool_options(self):
+        options = self.settings_dict['OPTIONS'].get('pool')
+        if not options or self.alias == NO_DB_ALIAS:
+            return None
+        return dict(options)
+
+    @property
+    def pool(self):
+        options = self.get_pool_options()
+        if options is None:
+            return None
+        options.pop('check', None)
+        key = (self.alias, self.settings_dict['NAME'])
+        with pools_lock:
+            if key not in pools:
+                pools[key] = ConnectionPool(
+                    kwargs=self.get_connection_params(),
+                    name=self.alias, **options)
+            return pools[key]
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_pooled_connection(self, pool):
+        check = self.get_pool_options().get('check', True)
+        for _ in range(pool.max_size + 1):
+            connection = pool.getconn()
+            if not check:
+                return connection
+            try:
+                connection.autocommit = True
+                connection.execute('SELECT 1')
+                return connection
+            except Error:
+                failed_checks[self.alias] = (
+                    failed_checks.get(self.alias, 0) + 1)
+                # Закрытое соединение пул заменит новым.
+                connection.close()
+                pool.putconn(connection)
+        return pool.getconn()
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level')
+        try:
+            self.isolation_level = IsolationLevel(
+                isolation_level or IsolationLevel.READ_COMMITTED)
+        except ValueError:
+            raise ImproperlyConfigured(
+                f'Invalid transaction isolation level {isolation_level} '
+                'specified. Use one of the psycopg.IsolationLevel values.')
+        connection = self.get_pooled_connection(pool)
+        connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        pool = getattr(self.connection, '_pool', None)
+        if pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.putconn(self.connection)
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -48,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.PerformanceMetricsMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -100,6 +103,61 @@ DATABASES = {
     }
 }
 
+# Пул соединений psycopg_pool: соединения переиспользуются между
+# запросами вместо подключения к PostgreSQL на каждый запрос.
+if os.getenv('DB_POOL', 'False') == 'True':
+    DATABASES['default'].update({
+        'ENGINE': 'foodgram.postgresql_pool',
+        'OPTIONS': {
+            'pool': {
+                'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+                'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+                'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', 600)),
+                'check': os.getenv('DB_POOL_CHECK', 'True') == 'True',
+            },
+        },
+    })
+
+# Реплики PostgreSQL для чтения: адреса host[:port] через запятую.
+# Безопасные запросы к вьюсетам с replica_reads = True читаются
+# с реплик, пользователь после изменения данных читает с основной базы
+# ещё REPLICA_STICKY_SECONDS секунд (нужен общий для процессов кеш).
+# Остальные параметры реплики берутся из основной базы, любой из них
+# можно задать переменной DB_REPLICA_<номер>_<параметр>, например
+# DB_REPLICA_1_NAME. В тестах реплика — зеркало основной базы, если
+# не задано DB_REPLICA_<номер>_TEST_MIRROR=False.
+DATABASE_REPLICAS = []
+for number, address in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', '').split(',')), 1):
+    host, _, port = address.strip().partition(':')
+    alias = f'replica_{number}'
+    DATABASES[alias] = dict(DATABASES['default'], HOST=host,
+                            PORT=port or DATABASES['default']['PORT'])
+    for key in ('ENGINE', 'NAME', 'USER', 'PASSWORD', 'HOST', 'PORT'):
+        value = os.getenv(f'DB_REPLICA_{number}_{key}')
+        if value:
+            DATABASES[alias][key] = value
+    if os.getenv(f'DB_REPLICA_{number}_TEST_MIRROR', 'True') == 'True':
+        DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+
+# Для нескольких процессов gunicorn нужен общий кеш (например, Redis),
+# иначе версии кешированных данных не будут общими.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', 60 * 60))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -143,7 +201,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
@@ -155,6 +213,12 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'api.paginations.CustomPageNumberPaginator',
 }
 
+# Кеш токенов авторизации: LRU-кеш процесса и, если задан алиас
+# AUTH_TOKEN_SHARED_CACHE, общий кеш из CACHES.
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 60))
+AUTH_TOKEN_SHARED_CACHE = os.getenv('AUTH_TOKEN_SHARED_CACHE', '')
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
@@ -170,4 +234,41 @@ DJOSER = {
     },
 }
 
+# Асинхронные представления для чтения рецептов, тегов, ингредиентов
+# и скачивания списка покупок. Включать при запуске через ASGI
+# (foodgram.asgi), под WSGI они только добавят накладные расходы.
+ASYNC_READ_API = os.getenv('ASYNC_READ_API', 'False') == 'True'
+
+# Доля запросов, для которых собираются метрики производительности.
+# Гистограммы хранятся в памяти процесса: каждый процесс gunicorn
+# отдаёт на /api/metrics/ только свои значения.
+PERFORMANCE_SAMPLE_RATE = float(os.getenv('PERFORMANCE_SAMPLE_RATE', 0.1))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 LIMIT = 6
+
+BULK_RECIPES_LIMIT = 100
+
+SEARCH_CONFIG = 'russian'
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+RECIPE_THUMBNAIL_SIZE = (480, 480)
+RECIPE_IMAGE_QUALITY = 80
+
+RECIPE_IMPORT_BATCH_SIZE = 500
+# Строки с картинками в base64 закрывают пачку раньше: в памяти
+# одновременно находятся строки пачки и декодированные картинки.
+RECIPE_IMPORT_BATCH_BYTES = 16 * 1024 * 1024
+RECIPE_IMPORT_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+RECIPE_IMPORT_IMAGE_TIMEOUT = 10
+
+# Авторы, у которых подписчиков больше FEED_FANOUT_LIMIT, не
+# раскладывают рецепты по лентам подписчиков при публикации: их рецепты
+# выбираются при чтении ленты.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 1000))
+FEED_BATCH_SIZE = 1000
+
+SHOPPING_CART_CHUNK_SIZE = 2000
+SHOPPING_CART_FONT = os.getenv(
+    'SHOPPING_CART_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
@@ -1,25 +1,44 @@
+from collections import Counter
+
 from django.contrib import admin
 
+from api.cache import bump_cache_version
+from api.utils import (RECIPE_COUNTERS, add_to_shopping_list,
+                       fan_out_recipes, get_recipes_amounts,
+                       remove_carts_from_shopping_lists,
+                       remove_from_shopping_list,
+                       remove_recipe_from_shopping_lists,
+                       remove_recipes_from_shopping_lists, update_counter,
+                       update_counters, update_recipe_in_shopping_lists,
+                       update_search_vectors)
+from users.models import CustomUser
+from .images import (delete_image_files, get_image_files,
+                     schedule_image_processing)
 from .models import (ShoppingCart, Tag, Ingredient, Recipe, IngredientRecipes,
-                     Favourite, TagRecipes)
+                     Favourite, FeedEntry, TagRecipes, ShoppingListItem)
 
 
 class TagAdmin(admin.ModelAdmin):
     """Модель администратора для тега."""
     list_display = ('id', 'name', 'color', 'slug')
+    search_fields = ('name', 'slug')
 
 
 class IngredientAdmin(admin.ModelAdmin):
     """Модель администратора для ингредиентов."""
     list_display = ('id', 'name', 'measurement_unit')
-    # list_filter = ('name')
+    search_fields = ('name',)
+    list_filter = ('measurement_unit',)
 
 
 class IngredientInline(admin.TabularInline):
     model = IngredientRecipes
     extra = 3
-    list_filter = ('name')
     min_num = 1
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient')
 
 
 class TagInline(admin.TabularInline):
@@ -30,35 +49,137 @@ class TagInline(admin.TabularInline):
 
 class RecipeAdmin(admin.ModelAdmin):
     """ Модель администратора для рецептов."""
-    list_display = ('id', 'author', 'name', 'cooking_time', 'is_favorite')
+    list_display = ('id', 'author', 'name', 'cooking_time', 'is_favorite',
+                    'in_carts_count')
     inlines = (IngredientInline, TagInline,)
-    list_filter = ('name', 'author', 'tags')
+    list_filter = ('tags',)
+    search_fields = ('name', 'author__username', 'author__email')
+    autocomplete_fields = ('author',)
+    list_select_related = ('author',)
+    show_full_result_count = False
 
+    @admin.display(description='Избранное', ordering='favorites_count')
     def is_favorite(self, obj):
-        return obj.favouriting.count()
+        return obj.favorites_count
+
+    def save_model(self, request, obj, form, change):
+        author_changed = change and 'author' in form.changed_data
+        if author_changed:
+            update_counter(CustomUser, [form.initial['author']],
+                           'recipes_count', -1)
+        image_changed = change and 'image' in form.changed_data
+        if image_changed:
+            delete_image_files(get_image_files(obj.pk))
+            obj.image_thumbnail = None
+            obj.image_webp = None
+        super().save_model(request, obj, form, change)
+        if image_changed or not change:
+            schedule_image_processing(obj)
+        if author_changed or not change:
+            update_counter(CustomUser, [obj.author_id], 'recipes_count')
+        if author_changed:
+            FeedEntry.objects.filter(recipe=obj).delete()
+        if author_changed or not change:
+            fan_out_recipes([obj])
+
+    def save_related(self, request, form, formsets, change):
+        old_amounts = get_recipes_amounts([form.instance]) if change else {}
+        super().save_related(request, form, formsets, change)
+        # Вектор строится по названию, описанию и ингредиентам, поэтому
+        # обновляется после сохранения связанных записей.
+        update_search_vectors([form.instance.pk])
+        if change:
+            update_recipe_in_shopping_lists(form.instance, old_amounts)
+        bump_cache_version(f'recipe:{form.instance.pk}')
+
+    def delete_model(self, request, obj):
+        remove_recipe_from_shopping_lists(obj)
+        super().delete_model(request, obj)
+        update_counter(CustomUser, [obj.author_id], 'recipes_count', -1)
+
+    def delete_queryset(self, request, queryset):
+        authors = Counter(queryset.values_list('author', flat=True))
+        remove_recipes_from_shopping_lists(queryset)
+        super().delete_queryset(request, queryset)
+        update_counters(CustomUser, {
+            author_id: -count for author_id, count in authors.items()
+        }, 'recipes_count')
+
+
+class RecipeCounterAdmin(admin.ModelAdmin):
+    """Базовая модель админа для избранного и списка покупок,
+    которая поддерживает счётчики рецептов."""
+    list_display = ('user', 'recipe')
+    search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    show_full_result_count = False
+
+    def save_model(self, request, obj, form, change):
+        field = RECIPE_COUNTERS[self.model]
+        if change:
+            update_counter(Recipe, [form.initial['recipe']], field, -1)
+        super().save_model(request, obj, form, change)
+        update_counter(Recipe, [obj.recipe_id], field)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        update_counter(Recipe, [obj.recipe_id], RECIPE_COUNTERS[self.model],
+                       -1)
+
+    def delete_queryset(self, request, queryset):
+        recipes = Counter(queryset.values_list('recipe', flat=True))
+        super().delete_queryset(request, queryset)
+        update_counters(Recipe, {
+            recipe_id: -count for recipe_id, count in recipes.items()
+        }, RECIPE_COUNTERS[self.model])
+
+
+class FavouriteAdmin(RecipeCounterAdmin):
+    """Модель админа для избранных рецептов."""
 
-    is_favorite.short_description = 'Избранное'
 
+class ShoppingCartAdmin(RecipeCounterAdmin):
+    """Модель админа для списка покупок."""
 
-class FavouriteAdmin(admin.ModelAdmin):
-    """Модель админа для избранных рецептов."""
-    list_display = ('user', 'recipe')
+    def save_model(self, request, obj, form, change):
+        if change:
+            old = ShoppingCart.objects.get(pk=obj.pk)
+            remove_from_shopping_list(old.user, [old.recipe])
+        super().save_model(request, obj, form, change)
+        add_to_shopping_list(obj.user, [obj.recipe])
 
+    def delete_model(self, request, obj):
+        remove_from_shopping_list(obj.user, [obj.recipe])
+        super().delete_model(request, obj)
 
-class ShoppingCartAdmin(admin.ModelAdmin):
-    """Модель админа для списка покупок."""
-    list_display = ('user', 'recipe')
+    def delete_queryset(self, request, queryset):
+        remove_carts_from_shopping_lists(queryset)
+        super().delete_queryset(request, queryset)
+
+
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    """Модель админа для сводных списков покупок."""
+    list_display = ('user', 'ingredient', 'amount')
+    search_fields = ('user__username', 'ingredient__name')
+    autocomplete_fields = ('user', 'ingredient')
+    list_select_related = ('user', 'ingredient')
+    show_full_result_count = False
 
 
 class IngredientRecipesAdmin(admin.ModelAdmin):
     """Модель админа для ингредиентов в рецептах."""
     list_display = ('recipe', 'ingredient', 'amount')
-    list_filter = ('ingredient', 'recipe')
+    search_fields = ('recipe__name', 'ingredient__name')
+    autocomplete_fields = ('recipe', 'ingredient')
+    list_select_related = ('recipe', 'ingredient')
+    show_full_result_count = False
 
 
 admin.site.register(Tag, TagAdmin)
 admin.site.register(IngredientRecipes, IngredientRecipesAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
+admin.site.register(ShoppingListItem, ShoppingListItemAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Favourite, FavouriteAdmin)
@@ -0,0 +1,100 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from api.cache import bump_cache_version
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS,
+                              thread_name_prefix='recipe-images')
+
+
+def encode_image(image, image_format):
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=settings.RECIPE_IMAGE_QUALITY)
+    return ContentFile(buffer.getvalue())
+
+
+def make_image_variants(recipe):
+    """Создаёт уменьшенную копию и WebP-версию картинки рецепта
+    и сохраняет их, если картинка не сменилась за время обработки."""
+    with recipe.image.open('rb') as file, Image.open(file) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    thumbnail = image.copy()
+    thumbnail.thumbnail(settings.RECIPE_THUMBNAIL_SIZE)
+    name = Path(recipe.image.name).stem
+    recipe.image_thumbnail.save(f'{name}.jpg',
+                                encode_image(thumbnail, 'JPEG'), save=False)
+    recipe.image_webp.save(f'{name}.webp',
+                           encode_image(image, 'WEBP'), save=False)
+    updated = Recipe.objects.filter(
+        pk=recipe.pk, image=recipe.image.name
+    ).update(image_thumbnail=recipe.image_thumbnail.name,
+             image_webp=recipe.image_webp.name)
+    if not updated:
+        recipe.image_thumbnail.delete(save=False)
+        recipe.image_webp.delete(save=False)
+        return
+    bump_cache_version(f'recipe:{recipe.pk}')
+
+
+def process_recipe_image(recipe_id):
+    try:
+        recipe = Recipe.objects.filter(pk=recipe_id).only(
+            'image', 'image_thumbnail', 'image_webp').first()
+        if recipe is not None and recipe.image:
+            make_image_variants(recipe)
+    except Exception:
+        logger.exception('Не удалось обработать картинку рецепта %s',
+                         recipe_id)
+
+
+def process_recipe_image_in_thread(recipe_id):
+    """Обработка в потоке пула: соединение потока с базой закрывается,
+    как в конце запроса."""
+    close_old_connections()
+    try:
+        process_recipe_image(recipe_id)
+    finally:
+        close_old_connections()
+
+
+def get_image_files(recipe_id):
+    """Имена файлов картинки рецепта и её копий. Строка блокируется
+    до конца транзакции, чтобы обработка в потоке не записала копии
+    заменяемой картинки, которые не попадут в список."""
+    return list(Recipe.objects.select_for_update().filter(
+        pk=recipe_id
+    ).values_list('image', 'image_thumbnail', 'image_webp').get())
+
+
+def delete_image_files(names):
+    """Удаляет файлы заменённой картинки после фиксации транзакции:
+    при откате рецепт продолжает ссылаться на них."""
+    names = [name for name in names if name]
+    storage = Recipe._meta.get_field('image').storage
+
+    def delete():
+        for name in names:
+            try:
+                storage.delete(name)
+            except OSError:
+                logger.exception('Не удалось удалить файл %s', name)
+
+    if names:
+        transaction.on_commit(delete)
+
+
+def schedule_image_processing(recipe):
+    """Ставит обработку картинки в пул потоков после фиксации транзакции,
+    не задерживая ответ на запрос."""
+    transaction.on_commit(
+        lambda: executor.submit(process_recipe_image_in_thread, recipe.pk))
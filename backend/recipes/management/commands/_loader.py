@@ -0,0 +1,148 @@
+import csv
+import json
+from itertools import islice
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.cache import bump_cache_version
+
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    """Поэлементно разбирает JSON-массив объектов, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Файл должен содержать JSON-массив.')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(','):
+            buffer = buffer[1:].lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise CommandError('Некорректный JSON в файле.')
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+class BulkLoadCommand(BaseCommand):
+    """Базовая команда пакетной идемпотентной загрузки справочника.
+
+    Записи сравниваются с базой по ключевым полям: новые добавляются,
+    отличающиеся обновляются, остальные пропускаются. Вся загрузка
+    выполняется в одной транзакции."""
+    model = None
+    default_file = None
+    fields = ()
+    key_fields = ()
+    update_fields = ()
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=Path(settings.BASE_DIR) / 'data' / self.default_file,
+            help='Путь к файлу .json или .csv.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество записей в одном запросе.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Показать изменения без записи в базу.'
+        )
+
+    def read_rows(self, path):
+        path = Path(path)
+        with open(path, newline='', encoding='utf-8') as file:
+            if path.suffix == '.csv':
+                for row in csv.reader(file):
+                    if row:
+                        yield dict(zip(self.fields, row))
+            elif path.suffix == '.json':
+                yield from iter_json_array(file)
+            else:
+                raise CommandError('Поддерживаются файлы .json и .csv.')
+
+    def get_key(self, row):
+        return tuple(row[field] for field in self.key_fields)
+
+    def get_existing(self, keys):
+        values = {key[0] for key in keys}
+        existing = {}
+        for obj in self.model.objects.filter(
+                **{f'{self.key_fields[0]}__in': values}):
+            key = tuple(getattr(obj, field) for field in self.key_fields)
+            if key in keys:
+                existing[key] = obj
+        return existing
+
+    def load_batch(self, rows, dry_run):
+        rows = {self.get_key(row): row for row in rows}
+        existing = self.get_existing(rows)
+        to_write, inserted, updated = [], 0, 0
+        for key, row in rows.items():
+            obj = existing.get(key)
+            if obj is None:
+                inserted += 1
+                if dry_run:
+                    self.stdout.write(f'+ {row}')
+            else:
+                changes = {field: (getattr(obj, field), row[field])
+                           for field in self.update_fields
+                           if getattr(obj, field) != row[field]}
+                if not changes:
+                    continue
+                updated += 1
+                if dry_run:
+                    self.stdout.write(f'~ {key}: {changes}')
+            to_write.append(self.model(**row))
+        if to_write and not dry_run:
+            if self.update_fields:
+                self.model.objects.bulk_create(
+                    to_write,
+                    update_conflicts=True,
+                    unique_fields=self.key_fields,
+                    update_fields=self.update_fields
+                )
+            else:
+                self.model.objects.bulk_create(to_write,
+                                               ignore_conflicts=True)
+        return inserted, updated, len(rows) - inserted - updated
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        rows = self.read_rows(options['path'])
+        inserted = updated = unchanged = 0
+        with transaction.atomic():
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                batch_inserted, batch_updated, batch_unchanged = (
+                    self.load_batch(batch, options['dry_run']))
+                inserted += batch_inserted
+                updated += batch_updated
+                unchanged += batch_unchanged
+        if (inserted or updated) and not options['dry_run']:
+            bump_cache_version(self.model._meta.model_name)
+        prefix = 'Пробный запуск. ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}{self.model._meta.verbose_name_plural}: '
+            f'добавлено {inserted}, обновлено {updated}, '
+            f'без изменений {unchanged} за {perf_counter() - start:.2f} с.'
+        ))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.utils import get_live_shopping_lists, update_shopping_lists
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = ('Сверяет сводные списки покупок с рецептами в корзинах '
+            'и при необходимости исправляет их.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Исправить найденные расхождения.'
+        )
+
+    def handle(self, *args, **options):
+        live = {(user_id, ingredient_id): total
+                for user_id, ingredient_id, total
+                in get_live_shopping_lists()}
+        stored = {(user_id, ingredient_id): amount
+                  for user_id, ingredient_id, amount
+                  in ShoppingListItem.objects.values_list(
+                      'user', 'ingredient', 'amount')}
+        deltas = {key: live.get(key, 0) - stored.get(key, 0)
+                  for key in live.keys() | stored.keys()
+                  if live.get(key, 0) != stored.get(key, 0)}
+        if not deltas:
+            self.stdout.write(self.style.SUCCESS(
+                'Списки покупок совпадают с корзинами.'))
+            return
+        for (user_id, ingredient_id), delta in sorted(deltas.items()):
+            self.stdout.write(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'сохранено {stored.get((user_id, ingredient_id), 0)}, '
+                f'по корзине {live.get((user_id, ingredient_id), 0)}'
+            )
+        if not options['rebuild']:
+            raise CommandError(f'Найдено расхождений: {len(deltas)}.')
+        update_shopping_lists(deltas)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено расхождений: {len(deltas)}.'))
@@ -0,0 +1,45 @@
+from itertools import groupby
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscriber
+
+
+class Command(BaseCommand):
+    help = ('Добавляет в ленты подписок недостающие рецепты авторов, '
+            'у которых подписчиков не больше FEED_FANOUT_LIMIT. '
+            'Нужна после появления лент и после ручных изменений базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.FEED_BATCH_SIZE,
+            help='Количество записей ленты в одном запросе.'
+        )
+
+    def handle(self, *args, **options):
+        limit = settings.FEED_FANOUT_LIMIT
+        subscribers = {}
+        for user_id, author_id in Subscriber.objects.filter(
+                author__subscribers_count__lte=limit
+        ).values_list('user', 'author').iterator():
+            subscribers.setdefault(author_id, []).append(user_id)
+        recipes = Recipe.objects.filter(
+            author__in=subscribers
+        ).order_by('author').values_list('author', 'pk', 'pub_date')
+        created = 0
+        for author_id, rows in groupby(recipes.iterator(),
+                                       key=lambda row: row[0]):
+            entries = [FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                                 pub_date=pub_date)
+                       for _, recipe_id, pub_date in rows
+                       for user_id in subscribers[author_id]]
+            FeedEntry.objects.bulk_create(
+                entries, batch_size=options['batch_size'],
+                ignore_conflicts=True)
+            created += len(entries)
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей ленты проверено: {created}.'))
@@ -0,0 +1,173 @@
+import random
+from itertools import accumulate
+from time import perf_counter
+from uuid import uuid4
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+
+from api.utils import update_search_vectors
+from recipes.models import (Favourite, Ingredient, IngredientRecipes, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag, TagRecipes)
+from users.models import CustomUser, Subscriber
+
+WORDS = ('суп', 'салат', 'пирог', 'каша', 'рагу', 'запеканка', 'соус',
+         'домашний', 'быстрый', 'летний', 'острый', 'сливочный', 'томатный',
+         'грибной', 'овощной', 'куриный', 'рыбный', 'сырный', 'постный')
+
+
+def zipf_weights(count, exponent=1.0):
+    """Накопленные веса распределения Ципфа: первые элементы
+    встречаются намного чаще последних, как в реальных данных."""
+    return list(accumulate(1 / (rank + 1) ** exponent
+                           for rank in range(count)))
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, рецептами, '
+            'избранным, списками покупок и подписками для нагрузочных '
+            'замеров. Ингредиенты и теги берутся из справочников.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Среднее число рецептов в избранном у пользователя.')
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Среднее число рецептов в списке покупок у пользователя.')
+        parser.add_argument(
+            '--subscriptions', type=int, default=10,
+            help='Среднее число подписок у пользователя.')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Количество строк в одном запросе.')
+        parser.add_argument(
+            '--seed', type=int,
+            help='Начальное значение генератора для повторяемых данных.')
+
+    def log(self, message):
+        self.stdout.write(f'{perf_counter() - self.start:7.1f} с  {message}')
+
+    def create_users(self, count, batch_size):
+        prefix = f'fake_{uuid4().hex[:8]}'
+        password = make_password('password')
+        users = CustomUser.objects.bulk_create(
+            (CustomUser(username=f'{prefix}_{number}',
+                        email=f'{prefix}_{number}@example.org',
+                        first_name='Тест', last_name=f'Пользователь {number}',
+                        password=password)
+             for number in range(count)),
+            batch_size=batch_size
+        )
+        self.log(f'пользователей: {len(users)}')
+        return [user.pk for user in users]
+
+    def create_recipes(self, count, user_ids, batch_size):
+        tags = list(Tag.objects.values_list('pk', flat=True))
+        ingredients = list(Ingredient.objects.values_list('pk', flat=True))
+        random.shuffle(ingredients)
+        author_weights = zipf_weights(len(user_ids))
+        tag_weights = zipf_weights(len(tags))
+        ingredient_weights = zipf_weights(len(ingredients))
+        recipe_ids = []
+        for start in range(0, count, batch_size):
+            recipes = Recipe.objects.bulk_create(
+                Recipe(author_id=author_id,
+                       name=f'{" ".join(random.sample(WORDS, 3))} {number}',
+                       text=' '.join(random.choices(WORDS, k=30)),
+                       cooking_time=random.randint(5, 180))
+                for number, author_id in enumerate(
+                    random.choices(user_ids, cum_weights=author_weights,
+                                   k=min(batch_size, count - start)),
+                    start)
+            )
+            batch_ids = [recipe.pk for recipe in recipes]
+            TagRecipes.objects.bulk_create(
+                TagRecipes(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in batch_ids
+                for tag_id in set(random.choices(
+                    tags, cum_weights=tag_weights, k=random.randint(1, 3)))
+            )
+            IngredientRecipes.objects.bulk_create(
+                IngredientRecipes(recipe_id=recipe_id,
+                                  ingredient_id=ingredient_id,
+                                  amount=random.randint(1, 500))
+                for recipe_id in batch_ids
+                for ingredient_id in set(random.choices(
+                    ingredients, cum_weights=ingredient_weights,
+                    k=random.randint(3, 12)))
+            )
+            update_search_vectors(batch_ids)
+            recipe_ids += batch_ids
+            self.log(f'рецептов: {len(recipe_ids)}')
+        return recipe_ids
+
+    def create_links(self, model, field, user_ids, targets, average,
+                     batch_size, exclude_self=False):
+        """Связывает пользователей с популярными по Ципфу объектами."""
+        weights = zipf_weights(len(targets))
+        links, created = [], 0
+        for user_id in user_ids:
+            count = min(int(random.expovariate(1 / average)), len(targets))
+            for target_id in set(random.choices(targets, cum_weights=weights,
+                                                k=count)):
+                if exclude_self and target_id == user_id:
+                    continue
+                links.append(model(user_id=user_id,
+                                   **{f'{field}_id': target_id}))
+            if len(links) >= batch_size:
+                model.objects.bulk_create(links, ignore_conflicts=True)
+                created += len(links)
+                links = []
+        model.objects.bulk_create(links, ignore_conflicts=True)
+        created += len(links)
+        self.log(f'{model._meta.verbose_name_plural}: {created}')
+
+    def create_shopping_lists(self, user_ids, batch_size):
+        """Сводные списки покупок новых пользователей по их корзинам."""
+        for start in range(0, len(user_ids), batch_size):
+            rows = IngredientRecipes.objects.filter(
+                recipe__shopping_cart__user__in=user_ids[
+                    start:start + batch_size]
+            ).values_list('recipe__shopping_cart__user', 'ingredient'
+                          ).annotate(total=Sum('amount')).order_by()
+            ShoppingListItem.objects.bulk_create(
+                (ShoppingListItem(user_id=user_id,
+                                  ingredient_id=ingredient_id,
+                                  amount=total)
+                 for user_id, ingredient_id, total in rows.iterator()),
+                batch_size=batch_size
+            )
+        self.log('сводные списки покупок')
+
+    def handle(self, *args, **options):
+        if not Ingredient.objects.exists() or not Tag.objects.exists():
+            raise CommandError('Сначала загрузите справочники: '
+                               'load_ingredients и load_tags.')
+        random.seed(options['seed'])
+        self.start = perf_counter()
+        batch_size = options['batch_size']
+        user_ids = self.create_users(options['users'], batch_size)
+        recipe_ids = self.create_recipes(options['recipes'], user_ids,
+                                         batch_size)
+        random.shuffle(recipe_ids)
+        self.create_links(Favourite, 'recipe', user_ids, recipe_ids,
+                          options['favorites'], batch_size)
+        self.create_links(ShoppingCart, 'recipe', user_ids, recipe_ids,
+                          options['carts'], batch_size)
+        self.create_links(Subscriber, 'author', user_ids, user_ids,
+                          options['subscriptions'], batch_size,
+                          exclude_self=True)
+        self.create_shopping_lists(user_ids, batch_size // 10 or 1)
+        call_command('reconcile_counters', batch_size=batch_size,
+                     stdout=self.stdout)
+        # Ленты заполняются после пересчёта счётчиков подписчиков,
+        # от которых зависит, каких авторов раскладывать по лентам.
+        call_command('fill_feed', batch_size=batch_size, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {perf_counter() - self.start:.1f} с. '
+            'Пароль всех пользователей: password.'))
@@ -0,0 +1,83 @@
+import json
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.imports import RecipeImporter
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ('Импортирует рецепты из файла NDJSON (один рецепт в формате '
+            'API на строку) пачками с возможностью продолжить импорт.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу .ndjson.')
+        parser.add_argument(
+            '--author',
+            required=True,
+            help='Username автора импортируемых рецептов.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.RECIPE_IMPORT_BATCH_SIZE,
+            help='Количество строк в одной транзакции.'
+        )
+        parser.add_argument(
+            '--rejects',
+            help='Файл для отклонённых строк (по умолчанию '
+                 '<path>.rejects.ndjson).'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл с номером последней записанной строки (по '
+                 'умолчанию <path>.checkpoint). Если он есть, импорт '
+                 'продолжается с этого места.'
+        )
+
+    def handle(self, *args, **options):
+        start_time = perf_counter()
+        path = Path(options['path'])
+        rejects_path = Path(options['rejects']
+                            or f'{path}.rejects.ndjson')
+        checkpoint_path = Path(options['checkpoint']
+                               or f'{path}.checkpoint')
+        try:
+            author = CustomUser.objects.get(username=options['author'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(
+                f'Пользователь {options["author"]} не найден.')
+        start = 0
+        if checkpoint_path.exists():
+            start = int(checkpoint_path.read_text() or 0)
+            self.stdout.write(f'Продолжение импорта со строки {start + 1}.')
+
+        with open(path, encoding='utf-8') as file, \
+                open(rejects_path, 'a', encoding='utf-8') as rejects:
+
+            def on_reject(line_number, line, errors):
+                rejects.write(json.dumps(
+                    {'line': line_number, 'errors': errors,
+                     'data': line.rstrip('\n')},
+                    ensure_ascii=False, default=str
+                ) + '\n')
+
+            def on_checkpoint(line_number):
+                rejects.flush()
+                checkpoint_path.write_text(str(line_number))
+
+            importer = RecipeImporter(
+                author, options['batch_size'], on_reject, on_checkpoint)
+            last_line = importer.run(file, start)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {last_line - start}, '
+            f'добавлено рецептов: {importer.created}, '
+            f'отклонено: {importer.rejected} '
+            f'за {perf_counter() - start_time:.2f} с.'
+        ))
+        if importer.rejected:
+            self.stdout.write(f'Отклонённые строки: {rejects_path}')
@@ -1,16 +1,10 @@
-import json
-from django.core.management.base import BaseCommand
-
 from recipes.models import Ingredient
+from ._loader import BulkLoadCommand
 
 
-class Command(BaseCommand):
-    def handle(self, *args, **options):
-        self.load_ingredient()
-
-    def load_ingredient(self, *args, **kwargs):
-        with open('data/ingredients.json',
-                  newline='', encoding='utf-8') as f_ingredient:
-            ingredients = json.loads(f_ingredient.read())
-            for ingredient in ingredients:
-                Ingredient.objects.get_or_create(**ingredient)
+class Command(BulkLoadCommand):
+    help = 'Загружает ингредиенты из data/ingredients.json или .csv.'
+    model = Ingredient
+    default_file = 'ingredients.json'
+    fields = ('name', 'measurement_unit')
+    key_fields = ('name', 'measurement_unit')
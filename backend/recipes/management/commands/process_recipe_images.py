@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Создаёт уменьшенные и WebP-версии картинок рецептов, '
+            'у которых их ещё нет.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать версии картинок для всех рецептов.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image__isnull=True).exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(
+                Q(image_thumbnail__isnull=True) | Q(image_webp__isnull=True))
+        # Список id читается заранее: обработка картинки может идти
+        # долго, и серверный курсор не должен оставаться открытым.
+        recipe_ids = list(recipes.values_list('pk', flat=True))
+        for recipe_id in recipe_ids:
+            process_recipe_image(recipe_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {len(recipe_ids)}.'))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from api.utils import COUNTERS, count_subquery
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики рецептов и пользователей с фактическими '
+            'данными и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество объектов в одном запросе на исправление.'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for model, field, related_model, related_field in COUNTERS:
+            drift = model.objects.annotate(
+                actual=count_subquery(related_model, related_field)
+            ).exclude(**{field: F('actual')}).values_list(
+                'pk', field, 'actual')
+            pks = []
+            for pk, stored, actual in drift.iterator():
+                if options['dry_run']:
+                    self.stdout.write(
+                        f'{model._meta.verbose_name} {pk}, {field}: '
+                        f'сохранено {stored}, фактически {actual}')
+                pks.append(pk)
+            if not options['dry_run']:
+                # Значение пересчитывается в самом UPDATE, чтобы не
+                # затереть изменения, сделанные после сверки.
+                for start in range(0, len(pks), options['batch_size']):
+                    model.objects.filter(
+                        pk__in=pks[start:start + options['batch_size']]
+                    ).update(**{field: count_subquery(related_model,
+                                                      related_field)})
+            total += len(pks)
+        if options['dry_run']:
+            self.stdout.write(f'Найдено расхождений: {total}.')
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено расхождений: {total}.'))
@@ -1,8 +1,10 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.core.validators import (MinValueValidator, MinLengthValidator,
                                     RegexValidator, MaxValueValidator)
 
-from users.models import CustomUser
+from users.models import CountersMixin, CustomUser
 
 
 class Tag(models.Model):
@@ -83,10 +85,17 @@ class TagRecipes(models.Model):
                 name='unique_recipetag'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['tag', 'recipe'],
+                name='tagrecipe_tag_recipe_idx'
+            ),
+        ]
 
 
-class Recipe(models.Model):
+class Recipe(CountersMixin, models.Model):
     """Модель рецептов."""
+    counter_fields = ('favorites_count', 'in_carts_count')
     tags = models.ManyToManyField(
         Tag,
         through=TagRecipes,
@@ -121,6 +130,18 @@ class Recipe(models.Model):
         null=True,
         default=None
     )
+    image_thumbnail = models.ImageField(
+        upload_to='recipes/thumbnail/',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    image_webp = models.ImageField(
+        upload_to='recipes/webp/',
+        null=True,
+        blank=True,
+        editable=False
+    )
     text = models.TextField()
     cooking_time = models.PositiveSmallIntegerField(
         validators=[
@@ -133,6 +154,17 @@ class Recipe(models.Model):
         ]
     )
     pub_date = models.DateTimeField(auto_now_add=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         verbose_name_plural = 'Рецепты'
@@ -144,6 +176,25 @@ class Recipe(models.Model):
                 name='unique_recipeauthor'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+            GinIndex(
+                fields=['search_vector'],
+                name='recipe_search_vector_idx'
+            ),
+            GinIndex(
+                fields=['name'],
+                opclasses=['gin_trgm_ops'],
+                name='recipe_name_trgm_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -169,6 +220,13 @@ class IngredientRecipes(models.Model):
     class Meta:
         verbose_name_plural = 'Ингредиенты в рецептах'
         verbose_name = 'Ингредиенты в рецептах'
+        indexes = [
+            models.Index(
+                fields=['recipe', 'ingredient'],
+                include=['amount'],
+                name='ingredientrecipe_covering_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.ingredient.name} {self.ingredient.measurement_unit}'
@@ -226,3 +284,74 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user} добавил {self.recipe} в список покупок'
+
+
+class ShoppingListItem(models.Model):
+    """Сводная позиция списка покупок пользователя.
+
+    Поддерживается при изменении списка покупок и ингредиентов рецептов,
+    чтобы скачивание списка не пересчитывало суммы каждый раз."""
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='shopping_list'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list'
+    )
+    amount = models.PositiveIntegerField()
+
+    class Meta:
+        verbose_name_plural = 'Сводные списки покупок'
+        verbose_name = 'Позиция списка покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_useringredient'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.amount}'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя.
+
+    Записи создаются при публикации рецепта для подписчиков автора.
+    Рецепты авторов, у которых подписчиков больше FEED_FANOUT_LIMIT,
+    сюда не попадают и выбираются при чтении ленты. Дата публикации
+    рецепта копируется в запись, чтобы лента читалась по индексу
+    (user, -pub_date) без обращения к остальным рецептам."""
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='feed'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    pub_date = models.DateTimeField('Дата публикации рецепта')
+
+    class Meta:
+        verbose_name_plural = 'Ленты подписок'
+        verbose_name = 'Запись ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feedentry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feedentry_user_pub_date_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
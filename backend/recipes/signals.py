@@ -0,0 +1,30 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.cache import bump_cache_version
+from api.utils import update_search_vectors
+from users.models import CustomUser
+from .models import Ingredient, Recipe, Tag
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_reference_version(sender, **kwargs):
+    bump_cache_version(sender._meta.model_name)
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes_search(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vectors(
+            Recipe.objects.filter(ingredients=instance).values('pk'))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def bump_recipe_version(sender, instance, **kwargs):
+    bump_cache_version(f'recipe:{instance.pk}')
+
+
+@receiver(post_save, sender=CustomUser)
+def bump_user_version(sender, instance, **kwargs):
+    bump_cache_version(f'user:{instance.pk}')
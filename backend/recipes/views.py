@@ -1,47 +1,86 @@
-from rest_framework import status, filters
+from rest_framework import status
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch
 from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet, ModelViewSet
-from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import (IsAdminUser, IsAuthenticated,
+                                        SAFE_METHODS)
 from rest_framework.decorators import action
 
 from api.permissions import AuthorOrReadOnly, AdminOrReadOnly
-from api.paginations import CustomPageNumberPaginator
-from api.filters import IngredientFilter, RecipeFilter
-from api.utils import get_shopping_cart
+from api.paginations import FeedPaginator, RecipePaginator
+from api.cache import VersionedCacheMixin
+from api.imports import RecipeImporter
+from api.filters import (IngredientSearchFilter, RecipeFilter,
+                         RecipeSearchFilter)
+from api.utils import (RECIPE_COUNTERS, get_feed, get_shopping_cart,
+                       add_to_shopping_list, remove_from_shopping_list,
+                       remove_recipe_from_shopping_lists, update_counter)
+from users.models import CustomUser, Subscriber
 from .models import (Tag, Ingredient, Recipe, ShoppingCart,
                      Favourite)
 from api.serializers import (RecipeCreateUpdateSerializer,
                              IngredientSerializer,
                              RecipeListSerializer,
-                             TagSerializer, RecipeSubscribSerializer)
+                             TagSerializer, RecipeSubscribSerializer,
+                             RecipeIdsSerializer)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(VersionedCacheMixin, ReadOnlyModelViewSet):
     """Вьюсет обработки запроса тегов."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AdminOrReadOnly,)
+    cache_name = 'tag'
+    replica_reads = True
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(VersionedCacheMixin, ReadOnlyModelViewSet):
     """Вьюсет обработки запроса ингредиентов."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AdminOrReadOnly,)
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
+    filter_backends = (IngredientSearchFilter,)
+    cache_name = 'ingredient'
+    replica_reads = True
 
 
 class RecipeViewSet(ModelViewSet):
     """Вьюсет обработки запроса рецептов."""
     queryset = Recipe.objects.all()
     serializer = RecipeCreateUpdateSerializer
-    pagination_class = CustomPageNumberPaginator
-    filter_backends = (filters.SearchFilter, DjangoFilterBackend, )
-    search_fields = ['^ingredients', ]
+    pagination_class = RecipePaginator
+    filter_backends = (RecipeSearchFilter, DjangoFilterBackend, )
     filterset_class = RecipeFilter
+    replica_reads = True
+
+    def get_queryset(self):
+        user = self.request.user
+        authors = CustomUser.objects.all()
+        if user.is_authenticated:
+            authors = authors.annotate(is_subscribed=Exists(
+                Subscriber.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+        # Автор загружается через Prefetch, чтобы подписка на него
+        # вычислялась тем же запросом, что и сами авторы страницы.
+        # Теги и ингредиенты подгружает сериализатор для рецептов,
+        # которых нет в кеше.
+        queryset = Recipe.objects.defer('search_vector').prefetch_related(
+            Prefetch('author', queryset=authors),
+        )
+        if user.is_authenticated:
+            # Флаги избранного и списка покупок вычисляются для всей
+            # страницы одним запросом, а не отдельным запросом на рецепт.
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favourite.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+            )
+        return queryset
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
@@ -49,14 +88,24 @@ class RecipeViewSet(ModelViewSet):
         return RecipeCreateUpdateSerializer
 
     def get_permissions(self):
-        if self.action == 'update' or 'destroy':
+        if self.action == 'import_recipes':
+            return (IsAdminUser(), )
+        if self.action in ('update', 'partial_update', 'destroy'):
             return (AuthorOrReadOnly(), )
         if self.action == 'create':
             return (IsAuthenticated(), )
+        return super().get_permissions()
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        remove_recipe_from_shopping_lists(instance)
+        instance.delete()
+        update_counter(CustomUser, [instance.author_id], 'recipes_count', -1)
+
+    @transaction.atomic
     def get_shop_favor_function(self, request, pk, models):
         recipe = get_object_or_404(Recipe, id=pk)
         if request.method == 'POST':
@@ -64,6 +113,9 @@ class RecipeViewSet(ModelViewSet):
                                          recipe=recipe).exists():
                 models.objects.create(user=self.request.user,
                                       recipe=recipe)
+                update_counter(Recipe, [recipe.pk], RECIPE_COUNTERS[models])
+                if models is ShoppingCart:
+                    add_to_shopping_list(self.request.user, [recipe])
                 serializer = RecipeSubscribSerializer(recipe)
                 return Response(serializer.data,
                                 status=status.HTTP_201_CREATED)
@@ -74,10 +126,57 @@ class RecipeViewSet(ModelViewSet):
                                      recipe=recipe).exists():
                 models.objects.filter(user=self.request.user,
                                       recipe=recipe).delete()
+                update_counter(Recipe, [recipe.pk], RECIPE_COUNTERS[models],
+                               -1)
+                if models is ShoppingCart:
+                    remove_from_shopping_list(self.request.user, [recipe])
                 return Response(status=status.HTTP_204_NO_CONTENT)
             return Response('errors: Объект не в списке.',
                             status=status.HTTP_400_BAD_REQUEST)
 
+    @transaction.atomic
+    def get_bulk_shop_favor_function(self, request, models):
+        """Добавляет или удаляет сразу несколько рецептов одним запросом
+        на запись и возвращает результат по каждому id."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['recipes']
+        user = request.user
+        # Блокировка пользователя упорядочивает параллельные изменения
+        # его списков, чтобы результат по каждому id был точным.
+        list(CustomUser.objects.select_for_update().filter(
+            id=user.id).values_list('id'))
+        in_list = dict(Recipe.objects.filter(id__in=ids).annotate(
+            in_list=Exists(models.objects.filter(user=user,
+                                                 recipe=OuterRef('pk')))
+        ).values_list('id', 'in_list'))
+        if request.method == 'POST':
+            changed = [pk for pk, exists in in_list.items() if not exists]
+            models.objects.bulk_create(
+                [models(user=user, recipe_id=pk) for pk in changed],
+                ignore_conflicts=True)
+            update_counter(Recipe, changed, RECIPE_COUNTERS[models])
+            if models is ShoppingCart:
+                add_to_shopping_list(user, changed)
+            outcomes = ('added', 'already_added')
+        else:
+            changed = [pk for pk, exists in in_list.items() if exists]
+            if changed:
+                models.objects.filter(user=user,
+                                      recipe_id__in=changed).delete()
+                update_counter(Recipe, changed, RECIPE_COUNTERS[models], -1)
+            if models is ShoppingCart:
+                remove_from_shopping_list(user, changed)
+            outcomes = ('removed', 'not_in_list')
+        changed = set(changed)
+        return Response([
+            {'id': pk,
+             'status': ('not_found' if pk not in in_list
+                        else outcomes[0] if pk in changed
+                        else outcomes[1])}
+            for pk in ids
+        ])
+
     @action(detail=True,
             permission_classes=[IsAuthenticated],
             methods=['post', 'delete'])
@@ -92,7 +191,55 @@ class RecipeViewSet(ModelViewSet):
         return self.get_shop_favor_function(
             request, pk, Favourite)
 
+    @action(detail=False,
+            permission_classes=[IsAuthenticated],
+            methods=['post', 'delete'],
+            url_path='shopping_cart/bulk')
+    def shopping_cart_bulk(self, request):
+        return self.get_bulk_shop_favor_function(request, ShoppingCart)
+
+    @action(detail=False,
+            permission_classes=[IsAuthenticated],
+            methods=['post', 'delete'],
+            url_path='favorite/bulk')
+    def favorite_bulk(self, request):
+        return self.get_bulk_shop_favor_function(request, Favourite)
+
+    @action(detail=False,
+            permission_classes=[IsAuthenticated],
+            pagination_class=FeedPaginator)
+    def feed(self, request):
+        """Рецепты авторов, на которых подписан пользователь,
+        от новых к старым."""
+        queryset = get_feed(self.filter_queryset(self.get_queryset()),
+                            request.user)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=False,
             permission_classes=[IsAuthenticated],)
     def download_shopping_cart(self, request):
-        return get_shopping_cart(request.user)
+        return get_shopping_cart(
+            request.user, request.query_params.get('file_format', 'txt'))
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_recipes(self, request):
+        """Импорт рецептов из тела запроса в формате NDJSON.
+
+        Тело читается построчно, не загружаясь в память целиком.
+        Параметр start позволяет пропустить уже импортированные строки."""
+        try:
+            start = int(request.query_params.get('start', 0))
+        except ValueError:
+            raise ValidationError({'start': 'Ожидается номер строки.'})
+        rejected = []
+        importer = RecipeImporter(
+            request.user,
+            on_reject=lambda line_number, line, errors: rejected.append(
+                {'line': line_number, 'errors': errors}),
+        )
+        last_line = importer.run(request.stream or (), start)
+        return Response({'created': importer.created,
+                         'rejected': rejected,
+                         'last_line': last_line})
@@ -1,18 +1,50 @@
+from collections import Counter
+
 from django.contrib import admin
 
+from api.utils import (add_to_feed, remove_from_feed, remove_subscribers,
+                       update_counter)
 from .models import Subscriber, CustomUser
 
 
 class CustomUserAdmin(admin.ModelAdmin):
     """ Модель администратора для пользователя """
-    list_display = ('id', 'username', 'email', 'password',
-                    'first_name', 'last_name')
-    list_filter = ('username', 'email')
+    list_display = ('id', 'username', 'email', 'first_name', 'last_name',
+                    'recipes_count', 'subscribers_count')
+    list_filter = ('is_staff', 'is_active')
+    search_fields = ('username', 'email', 'first_name', 'last_name')
+    show_full_result_count = False
 
 
 class SubscribedAdmin(admin.ModelAdmin):
     """ Модель администратора для подписок"""
     list_display = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    autocomplete_fields = ('user', 'author')
+    list_select_related = ('user', 'author')
+    show_full_result_count = False
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            remove_subscribers(form.initial['author'])
+            remove_from_feed(form.initial['user'], form.initial['author'])
+        super().save_model(request, obj, form, change)
+        update_counter(CustomUser, [obj.author_id], 'subscribers_count')
+        add_to_feed(obj.user_id, obj.author_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        remove_subscribers(obj.author_id)
+        remove_from_feed(obj.user_id, obj.author_id)
+
+    def delete_queryset(self, request, queryset):
+        subscriptions = list(queryset.values_list('user', 'author'))
+        super().delete_queryset(request, queryset)
+        authors = Counter(author_id for _, author_id in subscriptions)
+        for author_id, count in authors.items():
+            remove_subscribers(author_id, count)
+        for user_id, author_id in subscriptions:
+            remove_from_feed(user_id, author_id)
 
 
 admin.site.register(Subscriber, SubscribedAdmin)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.5 on 2026-10-18 15:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_customuser_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscriber',
+            index=models.Index(fields=['user', 'author'], name='subscriber_user_author_idx'),
+        ),
+    ]
@@ -2,8 +2,32 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 
 
-class CustomUser(AbstractUser):
+class CountersMixin:
+    """Поля counter_fields меняются только запросами update_counter.
+
+    Обычное сохранение существующего объекта их не записывает: значения
+    в памяти могли устареть, пока счётчик меняли другие запросы."""
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                deferred = self.get_deferred_fields()
+                update_fields = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.attname not in deferred
+                ]
+            kwargs['update_fields'] = [
+                name for name in update_fields
+                if name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class CustomUser(CountersMixin, AbstractUser):
     """Кастомная модель пользователя от AbstractUser."""
+    counter_fields = ('recipes_count', 'subscribers_count')
 
     username = models.CharField(
         max_length=150,
@@ -26,6 +50,16 @@ class CustomUser(AbstractUser):
         blank=True,
         null=True
     )
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов',
+        default=0,
+        editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        'Подписчиков',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         verbose_name_plural = 'Пользователи'
@@ -58,6 +92,12 @@ class Subscriber(models.Model):
                 name='unique_subscrib'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['user', 'author'],
+                name='subscriber_user_author_idx'
+            ),
+        ]
 
     def __str__(self) -> str:
         return f'Подписчик {self.user}, автор {self.author}'
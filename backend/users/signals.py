@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import forget_tokens
+from .models import CustomUser
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=CustomUser)
+def forget_user_tokens(sender, instance, created, **kwargs):
+    if not created:
+        forget_tokens(Token.objects.filter(
+            user_id=instance.pk).values_list('key', flat=True))
@@ -1,20 +1,28 @@
 from rest_framework.response import Response
 from rest_framework import status
+from django.db import connection, transaction
+from django.db.models import (F, Prefetch, Value, Window,
+                              prefetch_related_objects)
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 
 from .models import CustomUser, Subscriber
+from recipes.models import Recipe
 from api.serializers import (UserCreateSerializer, UserSerializer,
                              SubscribedSerializer)
-from api.paginations import CustomPageNumberPaginator
+from api.paginations import UserPaginator
+from api.utils import (add_to_feed, remove_from_feed, remove_subscribers,
+                       update_counter)
 
 
 class UserViewSet(UserViewSet):
     """Вьюсет обработки запроса пользователей."""
     queryset = CustomUser.objects.all()
-    pagination_class = CustomPageNumberPaginator
+    pagination_class = UserPaginator
+    replica_reads = True
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -30,12 +38,18 @@ class UserViewSet(UserViewSet):
         if request.method == 'POST':
             serializer = SubscribedSerializer(author,
                                               context={'request': request})
-            Subscriber.objects.create(user=user, author=author)
+            with transaction.atomic():
+                Subscriber.objects.create(user=user, author=author)
+                update_counter(CustomUser, [author.pk], 'subscribers_count')
+                add_to_feed(user.pk, author.pk)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
             if Subscriber.objects.filter(user=user, author=author).exists():
-                get_object_or_404(Subscriber, user=user,
-                                  author=author).delete()
+                with transaction.atomic():
+                    get_object_or_404(Subscriber, user=user,
+                                      author=author).delete()
+                    remove_subscribers(author.pk)
+                    remove_from_feed(user.pk, author.pk)
                 return Response(
                     {'message': 'Вы отписались от автора.'},
                     status=status.HTTP_204_NO_CONTENT)
@@ -49,8 +63,43 @@ class UserViewSet(UserViewSet):
             methods=('GET',))
     def subscriptions(self, request):
         user = request.user
-        authors = CustomUser.objects.filter(subscribing__user=user)
-        serializer = SubscribedSerializer(self.paginate_queryset(authors),
+        authors = CustomUser.objects.filter(subscribing__user=user).annotate(
+            is_subscribed=Value(True),
+        ).order_by('username')
+        page = self.paginate_queryset(authors)
+        authors = list(authors) if page is None else page
+        limit = request.query_params.get('recipes_limit')
+        features = connection.features
+        if (limit and authors
+                and features.supports_slicing_ordering_in_compound):
+            # Последние рецепты каждого автора выбираются отдельным
+            # подзапросом с LIMIT по индексу (author, -pub_date, -id);
+            # подзапросы объединяются в один запрос через UNION ALL.
+            recipes = Recipe.objects.order_by('-pub_date', '-id')
+            querysets = [recipes.filter(author=author)[:int(limit)]
+                         for author in authors]
+            limited = {author.pk: [] for author in authors}
+            for recipe in querysets[0].union(*querysets[1:], all=True):
+                limited[recipe.author_id].append(recipe)
+            for author in authors:
+                author.limited_recipes = sorted(
+                    limited[author.pk], key=lambda recipe: (
+                        recipe.pub_date, recipe.pk), reverse=True)
+        else:
+            # Последние рецепты всех авторов страницы выбираются одним
+            # запросом с нумерацией строк внутри каждого автора.
+            recipes = Recipe.objects.annotate(row_number=Window(
+                expression=RowNumber(),
+                partition_by=F('author'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            ))
+            if limit:
+                recipes = recipes.filter(row_number__lte=int(limit))
+            prefetch_related_objects(authors, Prefetch(
+                'recipes', queryset=recipes, to_attr='limited_recipes'))
+        serializer = SubscribedSerializer(authors,
                                           many=True,
                                           context={'request': request})
+        if page is None:
+            return Response(serializer.data)
         return self.get_paginated_response(serializer.data)